@@ -42,12 +42,43 @@ import os, numpy, sys, matplotlib.pyplot, argparse, glob
 
 #------------IO----------------#
 
-def get_connectome(filename):
+def get_connectome(filename, _cachemode = 'use', _cachedir = None):
     '''
     load connectonme into numnpy array
+    parsed once into binary .npy cache keyed by file path, size and modification time,
+    later loads are memory-mapped (same cache layout as the validation io.get_cached)
+
+    ---
+    input:
+        filename of comma separated connectome
+        [optional] _cachemode <use>, <rebuild> or <off>
+        [optional] _cachedir shared cache directory, default = .npycache directory next to input file
+    output:
+        numpy array
     '''
-    import numpy
-    return(numpy.genfromtxt(filename, delimiter=','))
+    import numpy, os, glob, hashlib, tempfile
+    if _cachemode == 'off':
+        return(numpy.genfromtxt(filename, delimiter=','))
+    filename = os.path.abspath(filename)
+    _stat = os.stat(filename)
+    _hash = hashlib.sha1('|'.join([filename, str(_stat.st_size), str(_stat.st_mtime_ns), 'connectome']).encode()).hexdigest()
+    _dir = _cachedir if _cachedir else os.path.join(os.path.dirname(filename), '.npycache')
+    _prefix = os.path.join(_dir, os.path.basename(filename) + '.' + hashlib.sha1(filename.encode()).hexdigest()[:8])
+    _cachefile = _prefix + '.' + _hash[:16] + '.npy'
+    if _cachemode != 'rebuild' and os.path.isfile(_cachefile):
+        return(numpy.load(_cachefile, mmap_mode = 'r'))
+    _matrix = numpy.genfromtxt(filename, delimiter=',')
+    try:
+        os.makedirs(_dir, exist_ok = True)
+        for _stale in glob.glob(glob.escape(_prefix) + '.*.npy'):
+            os.remove(_stale)
+        _handle, _temp = tempfile.mkstemp(dir = _dir, suffix = '.tmp')
+        with os.fdopen(_handle, 'wb') as f:
+            numpy.save(f, _matrix)
+        os.replace(_temp, _cachefile)
+    except OSError:
+        pass
+    return(_matrix)
 
 def save_plot(filename=None):
     '''
@@ -118,6 +149,9 @@ parser = argparse.ArgumentParser()
 parser.add_argument("--path", help="Define study folder.", default='/data')
 parser.add_argument("--subject", help="Define subject ID.", default='sub-P009')
 parser.add_argument("--session", help="Define session ID.", default='ses-01')
+parser.add_argument("--nocache", help="Parse connectome text files without binary cache, same as --cache off.", action='store_true')
+parser.add_argument("--cachedir", help="Define directory for binary connectome cache", default = os.environ.get('CacheDir'))
+parser.add_argument("--cache", help="Define connectome cache mode <use>, <rebuild> or <off>", default = 'use', choices = ['use', 'rebuild', 'off'])
 args = parser.parse_args()
 
 WD = os.path.join(args.path,args.subject,args.session,'connectome')
@@ -140,7 +174,7 @@ ConnectomeFiles = glob.glob(os.path.join(WD,'StructuralConnectome*'))
 
 for sc in ConnectomeFiles:
     log_msg(f'UPDATE:    plotting adjacency matrix for {sc}')
-    matrix = get_connectome(sc)
+    matrix = get_connectome(sc, _cachemode = 'off' if args.nocache else args.cache, _cachedir = args.cachedir)
     p = plot_adjacency(matrix, _rescale=True, _title = os.path.basename(sc[:-4]))
     colorbar(p)
     save_plot(os.path.join(OutDir,f'{os.path.basename(sc)[:-4]}.PNG'))
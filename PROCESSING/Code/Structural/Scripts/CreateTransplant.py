@@ -49,8 +49,14 @@ import nibabel, os, numpy, sys, scipy.ndimage, argparse
 
 
 def get_nii(filename):
+	'''
+	loading nifti image in its on-disk data type without float64 copy
+	'''
 	nii = nibabel.load(filename)
-	image = nii.get_fdata()
+	if nibabel.is_proxy(nii.dataobj) and nii.dataobj.slope == 1.0 and nii.dataobj.inter == 0.0:
+		image = numpy.asarray(nii.dataobj.get_unscaled())
+	else:
+		image = nii.get_fdata()
 	return(nii,image)
 
 def save_nii(image,origin,filename):
@@ -78,7 +84,7 @@ def get_smooth_mask(image, smoothing, _save = False):
     '''
     extract smooth mask for transition of healthy to lesioned tissue in VBT
     '''
-    smimage = scipy.ndimage.gaussian_filter(image, float(smoothing))
+    smimage = scipy.ndimage.gaussian_filter(image.astype(numpy.float64), float(smoothing))
     if _save:
         save_nii(smimage, MaskNii.affine, os.path.join(args.wd,'SmoothBorder.nii.gz'))
     maxvalue = numpy.max(smimage)
@@ -40,13 +40,26 @@ import nibabel , os, numpy, sys, argparse
 #                                           #
 #############################################
 
-def get_nii(filename):
+def get_nii(filename, _type = None):
     '''
     loading nifti image and extracting numpy array
+    read from on-disk data type without floating point intermediate:
+    _type = 'mask' returns boolean array, _type = 'labels' returns uint16/int32 array
     '''
     nii = nibabel.load(filename)
-    image = nii.get_fdata()
-    return(nii,image)
+    if _type is None:
+        return(nii,nii.get_fdata())
+    if nibabel.is_proxy(nii.dataobj) and nii.dataobj.slope == 1.0 and nii.dataobj.inter == 0.0:
+        image = numpy.asarray(nii.dataobj.get_unscaled())
+    else:
+        image = numpy.asarray(nii.dataobj)
+    if _type == 'mask':
+        return(nii,image != 0)
+    if image.dtype.kind == 'f':
+        image = numpy.rint(image)
+    if image.min() >= 0 and image.max() <= numpy.iinfo(numpy.uint16).max:
+        return(nii,image.astype(numpy.uint16, copy = False))
+    return(nii,image.astype(numpy.int32, copy = False))
 
 def get_lookup(_filename):
     '''
@@ -156,8 +169,8 @@ if not os.path.isfile(args.lut):
 
 OutputDir = os.path.dirname(args.maskimage)
 
-LesionNii, LesionImg = get_nii(args.maskimage)
-ParcNii, ParcImg = get_nii(args.parcimage)
+LesionNii, LesionImg = get_nii(args.maskimage, _type = 'mask')
+ParcNii, ParcImg = get_nii(args.parcimage, _type = 'labels')
 Lut = get_lookup(args.lut)
 
 #############################################
@@ -85,6 +85,7 @@ docker run \
                                        Possible options values:
                                        <global>:   global network metrics
                                        <local>:    local network metrics
+                                       <all>:      global and local network metrics
 
     -e Labels=<string>      [required] Comma delimited list of group labels to perform comparison for
 
@@ -103,8 +104,10 @@ docker run \
 
                             <stats>: Running statistical testing for groups
                                 required parameters:
-                                    Input matrices
+                                    <<Files>> [ list of per subject metric tables]
                                 optional parameters:
+                                    <<Labels>> [ group comparison of two files]
+                                    <<Statistic>> [ bootstrapped cohort <mean> or <median>]
                                     
                             <learning>:   Running machine learning based classification
                                 required parameters:
@@ -116,15 +119,34 @@ docker run \
                             a single file for each group [subject x features]
     
     -e Connectome=<string>  [optional] Connectome name to use for validation
+
+    -e Similarity=<string>  [optional] <true> to compute subject x subject connectome similarity
+                            and identifiability in connectome agreement mode. Default false
+
+    -e TileSize=<int>       [optional] Number of subjects per tile of the similarity matrix.
+                            If not provided default used is 256
     
     -e CVSplit=<float>      [optional] value between 0 and 1 defining training / test split
+                            or <loocv> for leave one out cross validation.
                             If not provided default used is 0.1
+
+    -e Algorithm=<string>   [optional] Classification algorithm <randomforest>, <svm>, <ridge> or <lda>
+                            If not provided default used is randomforest
+
+    -e Permutations=<int>   [optional] Maximum number of label permutations for sequential
+                            permutation testing of classification accuracy. Default 0 (off)
     
     -e PrefixOut=<string>   [optional] Prefix used for classification output files
                             If not provided default used is "OutPut_"
 
     -e OutDir=<string>      [optional] Path to output directory.
 
+    -e Workers=<int>        [optional] Number of parallel worker processes.
+                            If not provided default used is all available cores
+
+    -e CacheDir=<string>    [optional] Directory for binary cache of connectome / table text files.
+                            If not provided default used is ".npycache" next to input files
+
 *** ------------ INPUT ------------ ***
 
 
@@ -159,7 +181,7 @@ if [[ -z ${Step} ]]; then
 fi
 
 case "${Step}" in
-    learning)
+    learning|stats)
         if [ -z ${Files} ]; then
             log_msg "ERROR:    no <<Files>> variable defined"
             show_usage
@@ -180,6 +202,11 @@ if [[ -z ${OutDir} ]]; then
     OutDir=${Path}
 fi
 
+if [[ -z ${Workers} ]]; then
+    log_msg "UPDATE:    no <<Workers>> variable defined. using all available cores"
+    Workers=$(nproc)
+fi
+
 if [[ ! -d ${OutDir} ]]; then
     log_msg "UPDATE:    creating output directory ${OutDir}"
     mkdir -p ${OutDir}
@@ -234,7 +261,10 @@ case "${Step}" in
             -l ${Labels} \
             -o ${OutDir} \
             -a ${Atlas} \
-            -c ${Connectome}
+            -c ${Connectome} \
+            -w ${Workers} \
+            -s "${Similarity:-false}" \
+            -t "${TileSize:-256}"
 
     ;;
     metrics)
@@ -243,11 +273,17 @@ case "${Step}" in
             --labels ${Labels} \
             --level ${Level} \
             --connectome ${Connectome} \
+            --workers ${Workers} \
             --outdir ${OutDir}
 
     ;;
     stats)
-
+        python3 ${SRCDIR}/scripts/GetSummaryStatistics.py \
+            --path ${Path} \
+            --files ${Files} \
+            --labels "${Labels}" \
+            --statistic "${Statistic:-mean}" \
+            --outdir ${OutDir}
     ;;
     learning)
         python3 ${SRCDIR}/scripts/GetClassification.py \
@@ -255,7 +291,10 @@ case "${Step}" in
             --labels ${Labels} \
             --files ${Files} \
             --cvsplit "${CVSplit}" \
-            --outfile ${PrefixOut}
+            --algorithm "${Algorithm:-randomforest}" \
+            --permutations "${Permutations:-0}" \
+            --outfile ${PrefixOut} \
+            --workers ${Workers}
     ;;
 esac
 
@@ -52,7 +52,7 @@ source "${SRCDIR}/scripts/utils/utils.sh" # load utiuility functyions (logging,
 #-------------parse input-------------------#
 
 
-while getopts p:m:l:o:a:c: flag; do
+while getopts p:m:l:o:a:c:w:s:t: flag; do
     case "${flag}" in
         p) Path=${OPTARG} # Path to group level directories
         ;;
@@ -65,6 +65,12 @@ while getopts p:m:l:o:a:c: flag; do
         a) Atlas=${OPTARG} # Atlas used for parcellation
         ;;
         c) Connectome=${OPTARG} # Define connectome name to use
+        ;;
+        w) Workers=${OPTARG} # Number of parallel worker processes
+        ;;
+        s) Similarity=${OPTARG} # <true> to compute subject x subject similarity and identifiability
+        ;;
+        t) TileSize=${OPTARG} # Number of subjects per tile of similarity matrix
 
     esac
 done
@@ -74,20 +80,24 @@ if [[ "${Mode}" = "atlas" ]]; then
         --path ${Path} \
         --labels ${Labels} \
         --atlas ${Atlas} \
-        --outdir ${OutDir}
+        --outdir ${OutDir} \
+        --workers ${Workers}
 
 elif [[ "${Mode}" = "connectome" ]]; then
     python3 ${SRCDIR}/scripts/GetMetrics_connectome.py \
         --path ${Path} \
         --labels ${Labels} \
         --connectome ${Connectome} \
-        --outdir ${OutDir}
+        --outdir ${OutDir} \
+        --tilesize "${TileSize:-256}" \
+        $( [[ "${Similarity}" = "true" ]] && echo "--similarity" )
 
 else
     python3 ${SRCDIR}/scripts/GetMetrics_brainmask.py \
         --path ${Path} \
         --labels ${Labels} \
         --mode ${Mode} \
-        --outdir ${OutDir}
+        --outdir ${OutDir} \
+        --workers ${Workers}
 
 fi
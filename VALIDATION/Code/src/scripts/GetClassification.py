@@ -40,11 +40,22 @@ import os, sys, numpy, matplotlib.pyplot, nibabel, argparse, glob, multiprocessi
 parser = argparse.ArgumentParser()
 parser.add_argument("--path", help="Define input directory")
 parser.add_argument("--files", help="Define filenames input feature matrices")
-parser.add_argument("--cvsplit", help="Define cross-validation split")
+parser.add_argument("--cvsplit", help="Define cross-validation split, test set fraction or <loocv>")
 parser.add_argument("--labels", help="Define group labels for comparison")
 parser.add_argument("--outfile", help="Define output filename")
+parser.add_argument("--algorithm", help="Define classification algorithm <randomforest>, <svm>, <ridge> or <lda>", default = 'randomforest', choices = ['randomforest', 'svm', 'ridge', 'lda'])
+parser.add_argument("--kernel", help="Define svm kernel function <linear> or <rbf>", default = 'linear', choices = ['linear', 'rbf'])
+parser.add_argument("--costs", help="Define comma delimited list of svm C values", default = '0.1')
+parser.add_argument("--permutations", help="Define maximum number of label permutations for significance testing, 0 = off", type = int, default = 0)
+parser.add_argument("--alpha", help="Define significance level for sequential permutation testing", type = float, default = 0.05)
+parser.add_argument("--seed", help="Define seed for label permutations", type = int, default = 0)
+parser.add_argument("--workers", help="Define number of parallel worker processes", type = int)
+parser.add_argument("--cachedir", help="Define directory for binary table cache", default = os.environ.get('CacheDir'))
+parser.add_argument("--cache", help="Define table cache mode <use>, <rebuild> or <off>", default = 'use', choices = ['use', 'rebuild', 'off'])
 args = parser.parse_args()
 
+io.set_cache(args.cachedir, args.cache)
+
 ####
 # TO DO: add parameter key=value pair input optio
 # comma seperated list, str.split(','), for item in list, dict(split[0]) = split[1]
@@ -83,6 +94,9 @@ else:
 if not args.cvsplit:
     helper.log_msg('UPDATE:    no cv split provided, using default 10%.')
     Split = 0.1
+elif args.cvsplit == 'loocv':
+    helper.log_msg('UPDATE:    using leave one out cross validation.')
+    Split = 'loocv'
 else:
     Split = float(args.cvsplit)
 
@@ -100,7 +114,9 @@ else:
 # Split='loocv'
 # Runs=10
 
-helper.log_msg("START:    Random Forest classification")
+Costs = [ float(c) for c in args.costs.split(',') ]
+
+helper.log_msg("START:    "+str(args.algorithm)+" classification")
 
 
 Data = learning.get_dict(Path,Files,Labels)
@@ -109,21 +125,45 @@ ClassLabels = learning.get_class_labels(Data)
 
 Features = learning.get_data_matrix(Data)
 
-pool = multiprocessing.Pool(multiprocessing.cpu_count())
-
 SplitGen = learning.get_split(_split=Split,_runs = 100)
+Splits = list(SplitGen.split(Features, ClassLabels))
 
 helper.log_msg("UPDATE:    Starting cross validation ")
-helper.log_msg("UPDATE:    Using default value of runs=100 ")
-
-Predictions = [ pool.apply(getattr(algorithms,'run_randomforest'), args=(Features,ClassLabels,train_idx, test_idx)) for train_idx, test_idx in SplitGen.split(Features, ClassLabels) ]
-
-helper.log_msg("UPDATE:    Extracting performance measures")
-Performance = learning.get_performance(Predictions)
-numpy.savetxt(os.path.join(Path,OutFile + '_Accuracy.txt'),Performance, header = str('Accuracy'), delimiter = ',')
-# numpy.savetxt(os.path.join(Path,OutFile + '_F1Score.txt'),Performance, header = str('F1Score'), delimiter = ',')
-
-Importance = learning.get_importance(Predictions)
-numpy.savetxt(os.path.join(Path, OutFile+ '_FeatureImportance.txt'),Importance, header = str('Importance'), delimiter = ',')
-
-helper.log_msg("FINISHED:    Random Forest classification")
+if Split != 'loocv':
+    helper.log_msg("UPDATE:    Using default value of runs=100 ")
+
+if args.algorithm == 'svm':
+    helper.log_msg("UPDATE:    Computing linear kernel matrix shared across folds")
+    Gram = algorithms.get_gram(Features)
+    Results = crossvalidation.run(getattr(algorithms,'run_svm_gram'), Features, ClassLabels, Splits, _workers = args.workers,
+        _options = {'_gram': Gram, '_costs': Costs, '_kernel': args.kernel})
+    Runs = [ ('' if len(Costs) == 1 else '_C'+str(Costs[c]), [ r[c] for r in Results ]) for c in range(len(Costs)) ]
+    Permutation = (getattr(algorithms,'run_svm_gram'), {'_gram': Gram, '_costs': Costs, '_kernel': args.kernel, '_importance': False}, Splits)
+elif args.algorithm == 'ridge' and Split == 'loocv':
+    Runs = [ ('', algorithms.run_ridge_loocv(Features, ClassLabels)) ]
+    Permutation = (getattr(algorithms,'run_ridge_loocv'), dict(), None)
+else:
+    Runs = [ ('', crossvalidation.run(getattr(algorithms,'run_'+str(args.algorithm)), Features, ClassLabels, Splits, _workers = args.workers)) ]
+    Permutation = (getattr(algorithms,'run_'+str(args.algorithm)), dict(), Splits)
+
+if args.permutations > 0:
+    helper.log_msg("UPDATE:    Running permutation test with up to "+str(args.permutations)+" permutations")
+    Observed = [ numpy.mean(learning.get_performance(Predictions)) for Suffix, Predictions in Runs ]
+    Test = permutation.run(Permutation[0], Features, ClassLabels, Observed, Permutation[2], _workers = args.workers, _options = Permutation[1],
+        _permutations = args.permutations, _alpha = args.alpha, _seed = args.seed)
+
+for Suffix, Predictions in Runs:
+    helper.log_msg("UPDATE:    Extracting performance measures "+str(Suffix).strip("_"))
+    Performance = learning.get_performance(Predictions)
+    numpy.savetxt(os.path.join(Path,OutFile + Suffix + '_Accuracy.txt'),Performance, header = str('Accuracy'), delimiter = ',')
+    # numpy.savetxt(os.path.join(Path,OutFile + '_F1Score.txt'),Performance, header = str('F1Score'), delimiter = ',')
+
+    Importance = learning.get_importance(Predictions)
+    numpy.savetxt(os.path.join(Path, OutFile + Suffix + '_FeatureImportance.txt'),Importance, header = str('Importance'), delimiter = ',')
+
+    if args.permutations > 0:
+        c = [ r[0] for r in Runs ].index(Suffix)
+        numpy.savetxt(os.path.join(Path, OutFile + Suffix + '_Permutation.txt'), [[Observed[c], Test['pvalue'][c], Test['permutations']]], header = str(['Accuracy', 'PValue', 'Permutations']), delimiter = ',')
+        numpy.savetxt(os.path.join(Path, OutFile + Suffix + '_PermutationNull.txt'), Test['null'][:,c], header = str('Accuracy'), delimiter = ',')
+
+helper.log_msg("FINISHED:    "+str(args.algorithm)+" classification")
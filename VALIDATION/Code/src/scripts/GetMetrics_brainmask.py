@@ -29,8 +29,8 @@
 #                                           #
 #############################################
 
-from utils.Utility import helper, io
-from utils.AgreementMetrics import agreement
+from utils.Utility import helper, io, scheduler, checkpoint, dataset
+from utils.AgreementMetrics import agreement, overlap, surface
 import os, sys, numpy, matplotlib.pyplot, nibabel, argparse, glob, multiprocessing
 
 #############################################
@@ -39,67 +39,48 @@ import os, sys, numpy, matplotlib.pyplot, nibabel, argparse, glob, multiprocessi
 #                                           #
 #############################################
 
-def get_dict(path,_labels,_filename):
+def get_dict(path,_labels,_filename,_binary = True):
     '''
     create dictionary containing both group images for given subject 
-    and corresponding filename for given mode
+    and corresponding filename for given mode, as binary masks
+    if _binary or in their stored intensities otherwise
     '''
     import glob
     data = dict()
     for l in _labels:
-        data[l] = io.get_nii(os.path.join(path,l,_filename)).get_fdata()
+        data[l] = io.get_mask(os.path.join(path,l,_filename)) if _binary else io.get_raw(os.path.join(path,l,_filename))
     return(data)
 
 
-def get_data(path,labels,subjectlist):
+def get_measures(path,_labels,_mode,_filename):
     '''
-    create dictionary for all subjects
-    '''
-    data = dict()
-    for s in subjectlist:
-        data[s] = get_dict(path,labels,s)
-    return(data)
-
-def get_mode_data(_dict):
-    '''
-    check mode compliange of data dictionary:
-    if mode == global > binarize input data
-    '''
-    _index = list(_dict.keys())
-    if len(list(numpy.unique(list( list(_dict.values())[0].values())[0]))) > 2:
-        for i in _index:
-            _fileidx = _dict[i].keys()
-            for f in _fileidx:
-                _dict[i][f] = numpy.where(_dict[i][f]!=0,1,0)
-    return(_dict)
-
-def get_subjectlist(path, _labels, _mode):
-    '''
-    extracting subject list for both groups and compare.
+    compute volume agreement measures for given subject
+    loading only the volumes of this subject.
+    binary volumes (mode global or 0/1 images) use confusion counts,
+    other volumes keep the intensity based dice and volume difference
 
     ---
     input:
         path to group directories
         _labels to select groups
-        _mode of processing volumes to include (e.g. 'FSL_WM')
+        _mode of imaging volumes, <global> binarizes input volumes
+        _filename of subject volume in both groups
     output:
-        subjectlist of elements in both groups.
-        Error if not same elements
+        list of overlap measures in order of MeasureList
+        followed by surface distance measures
     '''
-    import glob, os, sys
-    from utils.Utility import helper
-    _list = dict()
-    for l in _labels:
-        # _list[l] = [ os.path.basename(item) for item in glob.glob(os.path.join(path, str(l)+'/*'+str(_mode)+'.nii.gz')) ]
-        _list[l] = [ os.path.basename(item) for item in glob.glob(os.path.join(path, str(l)+'/*.nii.gz')) ]
-    if _list[_labels[0]] != _list[_labels[1]]:
-        mismatch = list(set(_list[_labels[0]]) - set(_list[_labels[1]]))
-        mismatch.append( list(set(_list[_labels[1]]) - set(_list[_labels[0]])))
-        helper.log_msg("ERROR:    unequal subjects in both groups. Please check before continuing.")
-        helper.log_msg('ERROR:    files not present in both lists: '+str(mismatch))
-        sys.exit()
-    else:
-        return(_list[_labels[0]])
+    import numpy
+    _data = get_dict(path,_labels,_filename,_mode == 'global')
+    _binary = all([ numpy.all((_data[l] == 0) | (_data[l] == 1)) for l in _labels ])
+    _masks = dict([ (l, numpy.asarray(_data[l]).astype(bool, copy = False)) for l in _labels ])
+    _counts = overlap.get_counts(_masks[_labels[0]], _masks[_labels[1]])
+    _surface = surface.get_measures(_masks[_labels[0]], _masks[_labels[1]], io.get_spacing(os.path.join(path,_labels[0],_filename)))
+    _measures = dict([ (m, getattr(overlap,m)(_counts)) for m in MeasureList ])
+    if not _binary:
+        _x, _y = [ numpy.asarray(_data[l], dtype = float) for l in _labels ]
+        _measures['dice'] = agreement.dice(_x, _y)
+        _measures['volume_difference'] = (numpy.sum(_x) - numpy.sum(_y)) / numpy.sum(_x)
+    return([ _measures[m] for m in MeasureList ] + [ _surface[m] for m in surface.measures ])
 
 #############################################
 #                                           #
@@ -112,6 +93,8 @@ parser.add_argument("--path", help="Define input directory", type=str)
 parser.add_argument("--labels", help="Define group labels for comparison", type = str)
 parser.add_argument("--mode", help="Define imaging mode to compare", type = str)
 parser.add_argument("--outdir", help="Define output directory", type = str)
+parser.add_argument("--workers", help="Define number of parallel worker processes", type = int)
+parser.add_argument("--checkpoint", help="Define per subject checkpoint mode <use>, <restart> or <off>", default = 'use', choices = ['use', 'restart', 'off'])
 args = parser.parse_args()
 
 if not args.path:
@@ -154,7 +137,11 @@ else:
 #############################################
 
 
-SubjectList = get_subjectlist(Path, Labels, Mode)
+Dataset = dataset(Path, OutDir)
+SubjectList = Dataset.scan(Labels, '*.nii.gz')
+
+MeasureList = ['dice', 'jaccard', 'volume_difference', 'sensitivity', 'precision']
+
 #############################################
 #                                           #
 #         PERFORM COMPUTATIONS              #
@@ -163,24 +150,9 @@ SubjectList = get_subjectlist(Path, Labels, Mode)
 
 helper.log_msg("START:    Computing brainmask agreement measure.")
 
-Data = get_data(Path, Labels, SubjectList)
-
-if Mode == 'global':
-    Data = get_mode_data(Data)
-
-pool = multiprocessing.Pool(multiprocessing.cpu_count())
-
-helper.log_msg("UPDATE:    Computing dice score agreement measure.")
-DiceScores = numpy.array([ pool.apply(agreement.dice,args=(Data[s][Labels[0]],Data[s][Labels[1]])) for s in SubjectList ]).reshape([len(SubjectList),1])
-
-helper.log_msg("UPDATE:    Computing jaccard score agreement measure.")
-JaccardScores = numpy.array([ pool.apply(agreement.measure_jaccard,args=(Data[s][Labels[0]],Data[s][Labels[1]])) for s in SubjectList ]).reshape([len(SubjectList),1])
-
-helper.log_msg("UPDATE:    Computing volume difference measure.")
-VolumeDifference = numpy.array([ (numpy.sum(Data[s][Labels[0]]) - numpy.sum(Data[s][Labels[1]])) / numpy.sum(Data[s][Labels[0]]) for s in SubjectList ]).reshape([len(SubjectList),1])
-
-
-Agreements = numpy.concatenate([DiceScores, JaccardScores, VolumeDifference], axis = 1)
+helper.log_msg("UPDATE:    Computing overlap agreement measures "+str(MeasureList)+" and surface distance measures "+str(surface.measures)+".")
+Agreements = numpy.array(scheduler.run(get_measures, [ (s,) for s in SubjectList ], _workers = args.workers, _shared = (Path, Labels, Mode),
+    _checkpoint = checkpoint.get(os.path.join(OutDir,'Checkpoints','VolumeAgreementMeasures'+str(Mode)), [Mode, Labels, MeasureList + surface.measures], args.checkpoint), _keys = Dataset.get_keys(Labels, SubjectList))).reshape([len(SubjectList),len(MeasureList)+len(surface.measures)])
 
-numpy.savetxt(os.path.join(OutDir,'VolumeAgreementMeasures'+str(Mode)+'.txt'), Agreements, header = 'dice, measure_jaccard, measure_difference', delimiter = ',')
+numpy.savetxt(os.path.join(OutDir,'VolumeAgreementMeasures'+str(Mode)+'.txt'), Agreements, header = ', '.join(MeasureList + surface.measures), delimiter = ',')
 helper.log_msg("FINISHED:    Computing brainmask agreement measure.")
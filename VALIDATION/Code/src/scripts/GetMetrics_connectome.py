@@ -28,68 +28,11 @@
 #                                           #
 #############################################
 
-from utils.Utility import helper, io
-from utils.AgreementMetrics import agreement
+from utils.Utility import helper, io, store, dataset
+from utils.AgreementMetrics import agreement, batch, identifiability
 
 import os, sys, numpy, matplotlib.pyplot, nibabel, argparse, glob, multiprocessing
 
-#############################################
-#                                           #
-#           HELPER FUNCTIONS                #
-#                                           #
-#############################################
-
-def get_dict(path,labels,_filename):
-    '''
-    create dictionary containing both group images for given filename
-    '''
-    import glob
-    data = dict()
-    for l in labels:
-        data[l] = io.get_connectome(os.path.join(path,l,_filename))
-        # data[l] = io.get_connectome(glob.glob(os.path.join(path,l,id)+'/'+str(id)+'*'+str(mode)+'.*')[0])
-    return(data)
-
-def get_data(path,labels,subjectlist):
-    '''
-    create dictionary for all subjects
-    '''
-    data = dict()
-    for s in subjectlist:
-        data[s] = get_dict(path,labels,s)
-    return(data)
-
-def get_subjectlist(path, _labels, _connectome):
-    '''
-    extracting subject list for both groups and compare.
-
-    ---
-    input:
-        path to group directories
-        _labels to select groups
-        _connectome naming to load for computations (e.g. 'FC')
-    output:
-        subjectlist of elements in both groups.
-        Error if not same elements
-    '''
-    import glob, os, sys
-    from utils.Utility import helper
-    _list = dict()
-    for l in _labels:
-        _list[l] = [ os.path.basename(item) for item in glob.glob(os.path.join(path, str(l)+'/*'+str(_connectome)+'.*')) ]
-    if not bool(_list[l]):
-        helper.log_msg("ERROR:    No files found. Please check naming.")
-    if _list[_labels[0]] != _list[_labels[1]]:
-        mismatch = list(set(_list[_labels[0]]) - set(_list[_labels[1]]))
-        mismatch.append( list(set(_list[_labels[1]]) - set(_list[_labels[0]])))
-        helper.log_msg("ERROR:    unequal subjects in both groups. Please check before continuing.")
-        helper.log_msg('ERROR:    files not present in both lists: '+str(mismatch))
-        sys.exit()
-    else:
-        return(_list[_labels[0]])
-
-
-
 #############################################
 #                                           #
 #              PARSE INPUT                  #
@@ -101,8 +44,14 @@ parser.add_argument("--path", help="Define input directory")
 parser.add_argument("--labels", help="Define group labels for comparison")
 parser.add_argument("--connectome", help="Define connectome name")
 parser.add_argument("--outdir", help="Define output directory")
+parser.add_argument("--similarity", help="Compute subject x subject similarity matrix and identifiability", action = 'store_true')
+parser.add_argument("--tilesize", help="Define number of subjects per tile for similarity matrix", type = int, default = 256)
+parser.add_argument("--cachedir", help="Define directory for binary table cache", default = os.environ.get('CacheDir'))
+parser.add_argument("--cache", help="Define table cache mode <use>, <rebuild> or <off>", default = 'use', choices = ['use', 'rebuild', 'off'])
 args = parser.parse_args()
 
+io.set_cache(args.cachedir, args.cache)
+
 if not args.path:
     helper.log_msg('ERROR:    no input directory provided.')
     sys.exit()
@@ -141,11 +90,13 @@ else:
 #                                           #
 #############################################
 
-SubjectList = get_subjectlist(Path, Labels, Connectome)
+SubjectList = dataset(Path, OutDir).scan(Labels, '*'+str(Connectome)+'.*')
 
 
 
-MeasureList = ['measure_hausdorff','measure_pearson']
+MeasureList = ['measure_hausdorff','measure_pearson','measure_spearman','measure_euclidean']
+
+ChunkSize = 64
 
 
 #############################################
@@ -158,18 +109,29 @@ helper.log_msg("START:    Computing network based agreement measures.")
 
 
 
-Data = get_data(Path, Labels, SubjectList)
-
-
 Metrics = numpy.zeros([len(SubjectList),len(MeasureList)])
 
-for s in SubjectList:
+Stores = dict()
+for l in Labels:
+    Stores[l] = store.build(os.path.join(OutDir,'ConnectomeStacks',str(l)+'_'+str(Connectome)), Path, l, SubjectList)
+
+for c in range(0, len(SubjectList), ChunkSize):
+    Chunk = SubjectList[c:c+ChunkSize]
+    Stacks = [ numpy.asarray(Stores[l].get_stack(Chunk), dtype = float) for l in Labels ]
     for method in MeasureList:
-        Metrics[SubjectList.index(s),MeasureList.index(method)] = getattr(agreement,method)(Data[s][Labels[0]],Data[s][Labels[1]])
+        Metrics[c:c+len(Chunk),MeasureList.index(method)] = getattr(batch,method)(Stacks[0],Stacks[1])
 
 
 numpy.savetxt(os.path.join(OutDir,'NetworkAgreementMeasures_'+str(args.labels)+'_'+str(Connectome)+'.txt'), Metrics, header = str(MeasureList), delimiter = ',')
 
+if args.similarity:
+    helper.log_msg("UPDATE:    Computing subject x subject similarity matrix.")
+    Similarity = identifiability.get_similarity(Stores[Labels[0]].data, Stores[Labels[1]].data,
+        [ Stores[Labels[0]].index(s) for s in SubjectList ], [ Stores[Labels[1]].index(s) for s in SubjectList ], _tile = args.tilesize)
+    numpy.savetxt(os.path.join(OutDir,'NetworkSimilarity_'+str(args.labels)+'_'+str(Connectome)+'.txt'), Similarity, header = str(SubjectList), delimiter = ',')
+    Identifiability = identifiability.get_measures(Similarity)
+    numpy.savetxt(os.path.join(OutDir,'NetworkIdentifiability_'+str(args.labels)+'_'+str(Connectome)+'.txt'), numpy.array(list(Identifiability.values())).reshape(1,-1), header = str(list(Identifiability.keys())), delimiter = ',')
+
 
 helper.log_msg("FINISHED:    Computing network based agreement measures.")
 
@@ -31,8 +31,8 @@
 #############################################
 
 
-from utils.Utility import helper, io
-from utils.AgreementMetrics import agreement
+from utils.Utility import helper, io, scheduler, checkpoint, dataset
+from utils.AgreementMetrics import agreement, surface
 import os, sys, numpy, matplotlib.pyplot, nibabel, argparse, glob, multiprocessing
 
 #############################################
@@ -48,72 +48,36 @@ def get_dict(path,labels,_filename):
     import glob
     data = dict()
     for l in labels:
-        data[l] = io.get_nii(os.path.join(path,l, _filename)).get_data().astype(int)
+        data[l] = io.get_labels(os.path.join(path,l, _filename))
     return(data)
 
-def get_data(path,labels,subjectlist):
-    '''
-    create dictionary for all subjects
-    '''
-    data = dict()
-    for s in subjectlist:
-        data[s] = get_dict(path,labels,s)
-    return(data)
-
-
-def get_subjectlist(path, _labels, _mode):
-    '''
-    extracting subject list for both groups and compare.
-
-    ---
-    input:
-        path to group directories
-        _labels to select groups
-        _mode of processing volumes to include (e.g. 'FSL_WM')
-    output:
-        subjectlist of elements in both groups.
-        Error if not same elements
-    '''
-    import glob, os, sys
-    from utils.Utility import helper
-    _list = dict()
-    for l in _labels:
-        _list[l] = [ os.path.basename(item) for item in glob.glob(os.path.join(path, str(l)+'/*'+str(_mode)+'.nii.gz')) ]
-    if _list[_labels[0]] != _list[_labels[1]]:
-        mismatch = list(set(_list[_labels[0]]) - set(_list[_labels[1]]))
-        mismatch.append( list(set(_list[_labels[1]]) - set(_list[_labels[0]])))
-        helper.log_msg("ERROR:    unequal subjects in both groups. Please check before continuing.")
-        helper.log_msg('ERROR:    files not present in both lists: '+str(mismatch))
-        sys.exit()
-    else:
-        return(_list[_labels[0]])
-
-def get_measures(_dict, _subject, _measures=['dice','volume_difference']):
+def get_measures(path, _labels, _filename, _measures=['dice','volume_difference']):
     '''
     function to compute ROI based measures for given subject
     to parallelize subject computations
     
     ---
     input:
-        _dict data dictionary with subject keys
-        _subject ID as key for data dictionary
-        _measures list to compute from agreement class object
+        path to group directories
+        _labels to select groups
+        _filename of subject parcellation in both groups
+        _measures list to compute from parcellation or surface class object
     output:
         numpy array for each measure
     '''
-    import numpy
-    from utils.AgreementMetrics import agreement
-    _data = _dict[_subject]
+    from utils.AgreementMetrics import parcellation, surface
+    _data = get_dict(path, _labels, _filename)
     _keys = list(_data.keys())
-    _rois = numpy.unique(_data[_keys[0]][_data[_keys[0]] != 0]).astype(int)
+    _histogram = parcellation.get_histogram(_data[_keys[0]], _data[_keys[1]])
+    _surface = dict()
+    if any([ m in surface.measures for m in _measures ]):
+        _surface = parcellation.get_surface(_data[_keys[0]], _data[_keys[1]], _histogram['rois'], io.get_spacing(os.path.join(path, _keys[0], _filename)))
     _output = dict()
     for m in _measures:
-        _output[m] = []
-    for r in _rois:
-        temp_x = numpy.where(_data[_keys[0]]==r,1,0)
-        temp_y = numpy.where(_data[_keys[1]]==r,1,0)
-        for m in _measures:
-            _output[m].append(getattr(agreement,m)(temp_x, temp_y))
+        if m in _surface:
+            _output[m] = _surface[m]
+        else:
+            _output[m] = getattr(parcellation,m)(_histogram)
     return(_output)
 
 
@@ -130,6 +94,8 @@ parser.add_argument("--path", help="Define input directory", default='/data')
 parser.add_argument("--labels", help="Define group labels for comparison")
 parser.add_argument("--atlas", help="Define atlas parcellation used")
 parser.add_argument("--outdir", help="Define output directory")
+parser.add_argument("--workers", help="Define number of parallel worker processes", type = int)
+parser.add_argument("--checkpoint", help="Define per subject checkpoint mode <use>, <restart> or <off>", default = 'use', choices = ['use', 'restart', 'off'])
 args = parser.parse_args()
 
 if not args.path:
@@ -169,13 +135,10 @@ else:
 #                                           #
 #############################################
 
-SubjectList = get_subjectlist(Path, Labels, Atlas)
-
-Data = get_data(Path, Labels, SubjectList)
-
-pool = multiprocessing.Pool(multiprocessing.cpu_count())
+Dataset = dataset(Path, OutDir)
+SubjectList = Dataset.scan(Labels, '*'+str(Atlas)+'.nii.gz')
 
-measure_list = ['dice','volume_difference', 'measure_euclid_distance']
+measure_list = ['dice','volume_difference', 'measure_euclid_distance'] + surface.measures
 #############################################
 #                                           #
 #         PERFORM COMPUTATIONS              #
@@ -184,7 +147,8 @@ measure_list = ['dice','volume_difference', 'measure_euclid_distance']
 
 helper.log_msg("START:    Computing parcellation based agreement measures.")
 
-Measures =  [ pool.apply(get_measures,args=(Data, s, measure_list)) for s in SubjectList ]
+Measures = scheduler.run(get_measures, [ (s, measure_list) for s in SubjectList ], _workers = args.workers, _shared = (Path, Labels),
+    _checkpoint = checkpoint.get(os.path.join(OutDir,'Checkpoints','ParcellationAgreement'+str(Atlas)), [Atlas, Labels, measure_list], args.checkpoint), _keys = Dataset.get_keys(Labels, SubjectList))
 
 Output = dict()
 for m in measure_list:
@@ -38,51 +38,44 @@ import os, sys, numpy, matplotlib.pyplot, nibabel, argparse, glob, multiprocessi
 #                                           #
 #############################################
 
-def get_dict(path,labels,_filename):
+def get_metrics(_store, _global, _local, _threshold, _backend, _subject):
     '''
-    create dictionary containing both group images for given subject ID
-    '''
-    import glob
-    data = dict()
-    for l in labels:
-        data[l] = io.get_connectome(os.path.join(path,l,_filename))
-    return(data)
+    compute all requested metrics of one subject from a single graph build,
+    intermediates (e.g. shortest paths) are shared between metrics.
 
-def get_data(path,labels,subjectlist):
-    '''
-    create dictionary for all subjects
+    ---
+    input:
+        _store connectome stack of group
+        _global list of global metrics
+        _local list of local metrics
+        _threshold absolute edge weight threshold
+        _backend graph metric backend
+        _subject subject identifier
+    output:
+        list of global metric values, list of local metric arrays
     '''
-    data = dict()
-    for s in subjectlist:
-        data[s] = get_dict(path,labels,s)
-    return(data)
+    from utils.NetworkMetrics import network, Global, Local
+    cc = network(_store.get(_subject), _threshold = _threshold, _backend = _backend)
+    return([getattr(Global,metric)(cc) for metric in _global], [getattr(Local,metric)(cc) for metric in _local])
 
-def get_subjectlist(path, _labels, _mode):
+def get_sweep(_store, _thresholds, _densities, _metrics, _backend, _subject):
     '''
-    extracting subject list for both groups and compare.
+    compute network metrics of one subject across multiple thresholds or
+    density targets by incremental edge addition.
 
     ---
     input:
-        path to group directories
-        _labels to select groups
-        _mode of processing volumes to include (e.g. 'FSL_WM')
+        _store connectome stack of group
+        _thresholds list of absolute edge weight thresholds or None
+        _densities list of proportional density targets or None
+        _metrics list of global metrics evaluated per step
+        _backend graph metric backend
+        _subject subject identifier
     output:
-        subjectlist of elements in both groups.
-        Error if not same elements
+        numpy.array (steps x metrics)
     '''
-    import glob, os, sys
-    from utils.Utility import helper
-    _list = dict()
-    for l in _labels:
-        _list[l] = [ os.path.basename(item) for item in glob.glob(os.path.join(path, str(l)+'/*'+str(_mode)+'.txt')) ]
-    if _list[_labels[0]] != _list[_labels[1]]:
-        mismatch = list(set(_list[_labels[0]]) - set(_list[_labels[1]]))
-        mismatch.append( list(set(_list[_labels[1]]) - set(_list[_labels[0]])))
-        helper.log_msg("ERROR:    unequal subjects in both groups. Please check before continuing.")
-        helper.log_msg('ERROR:    files not present in both lists: '+str(mismatch))
-        sys.exit()
-    else:
-        return(_list[_labels[0]])
+    from utils.NetworkMetrics import sweep
+    return(sweep.run(_store.get(_subject), _thresholds, _densities, _metrics, _backend))
 
 
 #############################################
@@ -94,11 +87,21 @@ def get_subjectlist(path, _labels, _mode):
 parser = argparse.ArgumentParser()
 parser.add_argument("--path", help="Define input directory")
 parser.add_argument("--labels", help="Define group labels for comparison")
-parser.add_argument("--level", help="Define level of metrics")
+parser.add_argument("--level", help="Define level of metrics <global>, <local> or <all>")
 parser.add_argument("--connectome", help="Define connectome name")
 parser.add_argument("--outdir", help="Define output directory")
+parser.add_argument("--cachedir", help="Define directory for binary table and null model surrogate cache", default = os.environ.get('CacheDir'))
+parser.add_argument("--cache", help="Define table cache mode <use>, <rebuild> or <off>", default = 'use', choices = ['use', 'rebuild', 'off'])
+parser.add_argument("--workers", help="Define number of parallel worker processes", type = int, default = None)
+parser.add_argument("--checkpoint", help="Define per subject checkpoint mode <use>, <restart> or <off>", default = 'use', choices = ['use', 'restart', 'off'])
+parser.add_argument("--seed", help="Define seed for null model surrogates", type = int, default = 0)
+parser.add_argument("--thresholds", help="Define comma delimited list of absolute thresholds for threshold sweep", default = None)
+parser.add_argument("--densities", help="Define comma delimited list of density targets for threshold sweep", default = None)
+parser.add_argument("--backend", help="Define graph metric backend <numpy> or <networkx>", default = 'numpy', choices = ['numpy', 'networkx'])
 args = parser.parse_args()
 
+io.set_cache(args.cachedir, args.cache)
+
 if not args.path:
     helper.log_msg('ERROR:    no input directory provided.')
     sys.exit()
@@ -128,6 +131,10 @@ if not args.connectome:
 else:
     Connectome = args.connectome
 
+if args.thresholds and args.densities:
+    helper.log_msg('ERROR:    provide either threshold or density targets for threshold sweep, not both.')
+    sys.exit()
+
 if not args.outdir:
     helper.log_msg('UPDATE:    no output directory provided. Using default <<Path>> variable')
     OutDir = Path
@@ -142,11 +149,12 @@ else:
 #############################################
 
 
+Dataset = dataset(Path, OutDir)
 if os.path.isfile(os.path.join(Path,'SubjectList.txt')):
-    SubjectList = io.load_table(os.path.join(Path,'SubjectList.txt'))
+    SubjectList = Dataset.scan(Labels, '*'+str(Connectome)+'.txt', io.load_list(os.path.join(Path,'SubjectList.txt')))
 else:
     helper.log_msg("UPDATE:    no subjectlist found, using all overlapping subjects in "+str(Labels))
-    SubjectList = get_subjectlist(Path,Labels,Connectome)
+    SubjectList = Dataset.scan(Labels, '*'+str(Connectome)+'.txt')
 
 
 #############################################
@@ -157,31 +165,46 @@ else:
 
 helper.log_msg("START:    Computing connectome network "+str(Level)+" metrics.")
 
-Data = get_data(Path, Labels, SubjectList)
-
+Stores = dict()
+for lab in Labels:
+    Stores[lab] = store.build(os.path.join(OutDir,'ConnectomeStacks',str(lab)+'_'+str(Connectome)), Path, lab, SubjectList)
 
+GlobalList = [ 'degree', 'cluster_coeff', 'between_cent', 'smallworldness', 'efficiency', 'char_path', 'local_efficiency', 'communicability' ] if Level in ['global', 'all'] else []
+LocalList = [ 'degree', 'cluster_coeff', 'between_cent', 'nodal_efficiency', 'local_efficiency', 'communicability' ] if Level in ['local', 'all'] else []
+nullmodel.set_options(os.path.join(args.cachedir, 'NullModels') if args.cachedir else None, args.workers, args.seed)
 
-if Level == "global":
-    MetricsList = [ 'degree', 'cluster_coeff', 'between_cent' ]
+if args.thresholds or args.densities:
+    Thresholds = [ float(t) for t in args.thresholds.split(',') ] if args.thresholds else None
+    Densities = [ float(d) for d in args.densities.split(',') ] if args.densities else None
+    Steps, Mode = (Thresholds, 'threshold') if Thresholds else (Densities, 'target_density')
+    SweepList = [ 'cluster_coeff', 'between_cent', 'smallworldness', 'efficiency', 'char_path' ]
     for lab in Labels:
-        Metrics = numpy.zeros([len(SubjectList),len(MetricsList)])
-        for s in SubjectList: 
-            cc = network(Data[s][lab], _threshold = 0.3)
-            for metric in MetricsList:
-                Metrics[SubjectList.index(s),MetricsList.index(metric)] = getattr(Global,metric)(cc)
-        numpy.savetxt(os.path.join(OutDir,'NetworkMetrics'+str(Connectome)+str(lab)+'Global.txt'), Metrics, header = str(MetricsList), delimiter = ',')
-
-if Level == "local":
-    MetricsList = [ 'degree', 'between_cent' ]
-    for lab in Labels:
-        Metrics = numpy.zeros([len(SubjectList),Data[SubjectList[0]][lab].shape[0]])
-        for metric in MetricsList:
-            helper.log_msg("UPDATE:    Computing "+str(metric)+" metric for "+str(lab))
-            for s in SubjectList:
-                cc = network(Data[s][lab], _threshold = 0.3)           
-                print('processing: '+str(s))
-                Metrics[SubjectList.index(s),:] = getattr(Local,metric)(cc)
-            numpy.savetxt(os.path.join(OutDir,'NetworkMetrics_th03_'+str(Connectome)+str(lab)+str(metric)+'.txt'), Metrics, header = str([ 'ROI_'+str(r) for r in numpy.arange(1,Metrics.shape[1]+1)]), delimiter = ',')
+        helper.log_msg("UPDATE:    Computing network metric "+str(Mode)+" sweep for "+str(lab))
+        Metrics = numpy.array(scheduler.run(get_sweep, [(s,) for s in SubjectList], _workers = args.workers,
+            _shared = (Stores[lab], Thresholds, Densities, SweepList, args.backend),
+            _checkpoint = checkpoint.get(os.path.join(OutDir,'Checkpoints','NetworkMetricsSweep'+str(Connectome)+str(lab)), [Steps, Mode, SweepList, args.backend, args.seed], args.checkpoint), _keys = Dataset.get_keys([lab], SubjectList)))
+        numpy.save(os.path.join(OutDir,'NetworkMetricsSweep'+str(Connectome)+str(lab)+'.npy'), Metrics)
+        Table = numpy.column_stack([numpy.repeat(numpy.arange(len(SubjectList)), len(Steps)), numpy.tile(Steps, len(SubjectList)), Metrics.reshape(-1, Metrics.shape[2])])
+        numpy.savetxt(os.path.join(OutDir,'NetworkMetricsSweep'+str(Connectome)+str(lab)+'.txt'), Table, header = str(['subject', Mode] + sweep.metrics + SweepList), delimiter = ',')
+    helper.log_msg("FINISHED:    Computing connectome network metric sweep.")
+    sys.exit()
+
+for lab in Labels:
+    helper.log_msg("UPDATE:    Computing network metrics for "+str(lab))
+    Results = scheduler.run(get_metrics, [(s,) for s in SubjectList], _workers = args.workers,
+        _shared = (Stores[lab], GlobalList, LocalList, 0.3, args.backend),
+        _checkpoint = checkpoint.get(os.path.join(OutDir,'Checkpoints','NetworkMetrics'+str(Connectome)+str(lab)+str(Level)), [Level, GlobalList, LocalList, 0.3, args.backend, args.seed], args.checkpoint), _keys = Dataset.get_keys([lab], SubjectList))
+    if GlobalList:
+        Metrics = numpy.array([r[0] for r in Results])
+        numpy.savetxt(os.path.join(OutDir,'NetworkMetrics'+str(Connectome)+str(lab)+'Global.txt'), Metrics, header = str(GlobalList), delimiter = ',')
+    if LocalList:
+        Size = Stores[lab].meta['size']
+        Metrics = numpy.array([numpy.concatenate(r[1]) for r in Results])
+        helper.log_msg("UPDATE:    Saving local metrics for "+str(lab))
+        numpy.savetxt(os.path.join(OutDir,'NetworkMetrics_th03_'+str(Connectome)+str(lab)+'Local.txt'), Metrics, header = str([ str(metric)+'_ROI_'+str(r) for metric in LocalList for r in numpy.arange(1,Size+1)]), delimiter = ',')
+        for metric in LocalList:
+            i = LocalList.index(metric)
+            numpy.savetxt(os.path.join(OutDir,'NetworkMetrics_th03_'+str(Connectome)+str(lab)+str(metric)+'.txt'), Metrics[:,i*Size:(i+1)*Size], header = str([ 'ROI_'+str(r) for r in numpy.arange(1,Size+1)]), delimiter = ',')
 
 
 helper.log_msg("FINISHED:    Computing connectome network "+str(Level)+" metrics.")
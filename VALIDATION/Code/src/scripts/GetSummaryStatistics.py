@@ -0,0 +1,119 @@
+#!/bin/python
+#
+# # GetSummaryStatistics.py
+#
+# * Brain Simulation Section
+# * Charité Berlin Universitätsmedizin
+# * Berlin Institute of Health
+#
+# ## Author(s)
+# * Bey, Patrik, Charité Universitätsmedizin Berlin, Berlin Institute of Health
+#
+#
+# * last update: 2023.08.01
+#
+#
+# This script is a wrapper for cohort level summaries of per subject
+# validation metric tables (e.g. VolumeAgreementMeasures, dice, NetworkAgreementMeasures)
+# with bootstrap confidence intervals and optional group comparison
+# for the Validation container as used in (Bey et al., in prep.)
+#
+#
+#
+
+#############################################
+#                                           #
+#        SUMMARY STATISTICS WRAPPER         #
+#                                           #
+#############################################
+
+
+from utils.Utility import *
+from utils.StatisticsLearning import *
+import os, sys, numpy, argparse
+
+#############################################
+#                                           #
+#              PARSE INPUT                  #
+#                                           #
+#############################################
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--path", help="Define input directory")
+parser.add_argument("--files", help="Define filenames of per subject metric tables")
+parser.add_argument("--labels", help="Define group labels of files for group comparison")
+parser.add_argument("--outdir", help="Define output directory")
+parser.add_argument("--statistic", help="Define cohort statistic <mean> or <median>", default = 'mean', choices = ['mean', 'median'])
+parser.add_argument("--draws", help="Define number of bootstrap resamples", type = int, default = 10000)
+parser.add_argument("--confidence", help="Define confidence level of intervals", type = float, default = 0.95)
+parser.add_argument("--test", help="Define group comparison test <ttest> or <utest>", default = 'ttest', choices = ['ttest', 'utest'])
+parser.add_argument("--correction", help="Define multiple comparison correction <fdr> or <maxt>", default = 'fdr', choices = ['fdr', 'maxt'])
+parser.add_argument("--seed", help="Define seed for resampling", type = int, default = 0)
+parser.add_argument("--cachedir", help="Define directory for binary table cache", default = os.environ.get('CacheDir'))
+parser.add_argument("--cache", help="Define table cache mode <use>, <rebuild> or <off>", default = 'use', choices = ['use', 'rebuild', 'off'])
+args = parser.parse_args()
+
+io.set_cache(args.cachedir, args.cache)
+
+if not args.path:
+    helper.log_msg('ERROR:    no input directory provided.')
+    sys.exit()
+else:
+    Path = args.path
+
+if not args.files:
+    helper.log_msg('ERROR:    no metric table files provided.')
+    sys.exit()
+else:
+    if ',' in args.files:
+        Files = args.files.split(',')
+    elif ';' in args.files:
+        Files = args.files.split(';')
+    else:
+        Files = args.files.split(' ')
+
+if not args.labels:
+    Labels = None
+else:
+    if ',' in args.labels:
+        Labels = args.labels.split(',')
+    elif ';' in args.labels:
+        Labels = args.labels.split(';')
+    else:
+        Labels = args.labels.split(' ')
+
+if not args.outdir:
+    helper.log_msg('UPDATE:    no output directory provided. Using default <<Path>> variable')
+    OutDir = Path
+else:
+    OutDir = args.outdir
+
+
+#############################################
+#                                           #
+#         PERFORM COMPUTATIONS              #
+#                                           #
+#############################################
+
+helper.log_msg("START:    Computing cohort summary statistics.")
+
+Tables = dict()
+for f in Files:
+    Tables[f] = io.load_table(os.path.join(Path,f))
+    helper.log_msg("UPDATE:    Bootstrapping "+str(args.statistic)+" for "+str(f))
+    Summary = stats.get_bootstrap(Tables[f], _statistic = args.statistic, _draws = args.draws, _confidence = args.confidence, _seed = args.seed)
+    numpy.savetxt(os.path.join(OutDir,os.path.splitext(os.path.basename(f))[0]+'_Summary.txt'),
+        numpy.column_stack([Summary['estimate'], Summary['percentile'].T, Summary['bca'].T]),
+        header = str([args.statistic, 'percentile_low', 'percentile_high', 'bca_low', 'bca_high']), delimiter = ',')
+
+if Labels and len(Files) == 2:
+    helper.log_msg("UPDATE:    Comparing "+str(Labels[0])+" and "+str(Labels[1])+" using "+str(args.test))
+    Comparison = stats.get_groupstats(Tables[Files[0]], Tables[Files[1]], _test = args.test, _correction = args.correction, _seed = args.seed)
+    # mann-whitney statistic is the normal approximation z, U of first group is written alongside
+    Columns, Values = ['t', 'pvalue', str(args.correction)], [Comparison['statistic'], Comparison['pvalue'], Comparison['corrected']]
+    if args.test == 'utest':
+        Columns, Values = ['U', 'z'] + Columns[1:], [Comparison['U']] + Values
+    numpy.savetxt(os.path.join(OutDir,'GroupComparison_'+str(Labels[0])+'_'+str(Labels[1])+'.txt'),
+        numpy.column_stack(Values), header = str(Columns), delimiter = ',')
+
+helper.log_msg("FINISHED:    Computing cohort summary statistics.")
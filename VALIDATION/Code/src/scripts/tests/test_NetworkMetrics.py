@@ -0,0 +1,60 @@
+#!/bin/python
+#
+# # test_NetworkMetrics.py
+#
+# tests of network metric computations in utils/NetworkMetrics.py
+#
+
+import os, sys, numpy
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.NetworkMetrics import network, nullmodel, Global
+
+
+def get_ring(_size, _seed = 0):
+    '''
+    weighted ring with random chords, connected at threshold 0.3
+    '''
+    _random = numpy.random.default_rng(_seed)
+    _matrix = numpy.zeros([_size, _size])
+    for i in range(_size):
+        _matrix[i, (i + 1) % _size] = _matrix[i, (i + 2) % _size] = 0.5 + 0.5 * _random.random()
+    _chords = numpy.triu(_random.random([_size, _size]) < 0.1, 3) * _random.random([_size, _size])
+    _matrix = numpy.maximum(_matrix, _chords)
+    return(numpy.maximum(_matrix, _matrix.T))
+
+
+def test_smallworld_disconnected():
+    '''
+    isolated nodes at the threshold give nan instead of raising
+    '''
+    nullmodel.set_options(None, 1, 0)
+    _matrix = get_ring(16)
+    _matrix[:2, :] = _matrix[:, :2] = 0.1
+    cc = network(_matrix, _threshold = 0.3)
+    assert numpy.isnan(Global.smallworldness(cc))
+    assert numpy.isnan(Global.smallworld_sigma(cc))
+
+
+def test_smallworld_connected():
+    '''
+    connected graphs give finite coefficients with the default backend
+    '''
+    nullmodel.set_options(None, 1, 0)
+    cc = network(get_ring(16), _threshold = 0.3)
+    assert numpy.isfinite(Global.smallworldness(cc))
+    assert numpy.isfinite(Global.smallworld_sigma(cc))
+
+
+def test_negative_weights():
+    '''
+    negative weights are used as absolute path lengths by both backends
+    '''
+    from utils.NetworkMetrics import native, Local
+    _matrix = get_ring(16, 1)
+    _matrix[_matrix > 0.8] *= -1
+    numpy.fill_diagonal(_matrix, 0)
+    cc = network(_matrix, _threshold = 0.3, _backend = 'numpy')
+    nx = network(_matrix, _threshold = 0.3, _backend = 'networkx')
+    assert numpy.allclose(Local.between_cent(cc), Local.between_cent(nx))
+    assert numpy.isclose(Global.short_path(cc), Global.short_path(nx))
+    assert numpy.allclose(native.distance(_matrix), native.distance_stack(_matrix[None])[0])
@@ -31,37 +31,7 @@
 #############################################
 
 
-# from utils.Utility import *
-
-class transform:
-    '''
-    transformation helper functions
-    '''
-    def __init__(self, _path, _string):
-        '''
-        initializing class object
-        '''
-    def vectorize(_array):
-        '''
-        given a symmetric matrix , return entries of upper triangle
-        matrix as flattened vector
-        '''
-        import numpy
-        vec = _array[numpy.triu_indices(_array.shape[0])]
-        return(numpy.asarray(vec))
-    def binarize(_array):
-        '''
-        binarize input array
-
-        ---
-        input:
-            numpy.array
-        output:
-            returning binarized array
-        '''
-        _binarray = _array.copy()
-        _binarray[_binarray != 0] = 1
-        return(_binarray)
+from utils.Utility import transform
 
 class agreement:
     '''
@@ -180,3 +150,408 @@ class agreement:
     #     M = _array1_mod @ _array2 @ _array1_mod
     #     u, s, vh = numpy.linalg.svd(M, full_matrices=True)
     #     return(numpy.sqrt(numpy.sum(numpy.log(s)**2)))
+
+
+class parcellation:
+    '''
+    class object computing ROI based agreement measures for two
+    label images from a single joint label histogram
+    '''
+    def __init__(self):
+        '''
+        intialization of parcellation measure class
+        '''
+    def get_histogram(_array1, _array2, _rois = None):
+        '''
+        compute joint label histogram for two label images in one pass.
+
+        ---
+        input:
+            numpy arrays of same dimensions containing non-negative integer labels
+            [optional] _rois list of ROI labels to report, default = nonzero labels of _array1
+        output:
+            dictionary containing ROI labels, intersection, volumes and
+            coordinate sums of both label images for each ROI
+        '''
+        import numpy
+        _flat1 = numpy.asarray(_array1).ravel()
+        _flat2 = numpy.asarray(_array2).ravel()
+        _length = int(max(_flat1.max(), _flat2.max())) + 1
+        _volume = numpy.zeros([2, _length])
+        _coords = numpy.zeros([2, _length, _array1.ndim])
+        for i, _flat in enumerate([_flat1, _flat2]):
+            _voxels = numpy.flatnonzero(_flat)
+            _labels = _flat[_voxels]
+            _volume[i] = numpy.bincount(_labels, minlength = _length)
+            for a, _axis in enumerate(numpy.unravel_index(_voxels, _array1.shape)):
+                _coords[i, :, a] = numpy.bincount(_labels, weights = _axis, minlength = _length)
+        _intersection = numpy.bincount(_flat1[_flat1 == _flat2], minlength = _length)
+        if _rois is None:
+            _rois = numpy.flatnonzero(_volume[0])
+            _rois = _rois[_rois != 0]
+        _rois = numpy.asarray(_rois).astype(int)
+        return({
+            'rois': _rois,
+            'intersection': _intersection[_rois].astype(float),
+            'volume': _volume[:, _rois],
+            'coordinates': _coords[:, _rois, :]})
+    def get_surface(_array1, _array2, _rois, _spacing = None):
+        '''
+        compute surface distance measures for all ROIs, each restricted
+        to the bounding box of the ROI in both label images
+
+        ---
+        input:
+            numpy arrays of same dimensions containing non-negative integer labels
+            _rois list of ROI labels (e.g. from get_histogram)
+            [optional] _spacing voxel sizes in mm
+        output:
+            dictionary containing array of ROI values for each surface measure
+        '''
+        import numpy, scipy.ndimage
+        _objects = [ scipy.ndimage.find_objects(numpy.asarray(a)) for a in [_array1, _array2] ]
+        _output = dict([ (m, numpy.full(len(_rois), numpy.nan)) for m in surface.measures ])
+        for i, r in enumerate(_rois):
+            _boxes = [ o[r-1] for o in _objects if r-1 < len(o) and o[r-1] is not None ]
+            if len(_boxes) < 2:
+                continue
+            _bbox = tuple( slice(max(min(b[a].start for b in _boxes) - 1, 0), min(max(b[a].stop for b in _boxes) + 1, _array1.shape[a])) for a in range(_array1.ndim) )
+            _measures = surface.get_measures(_array1[_bbox] == r, _array2[_bbox] == r, _spacing)
+            for m in surface.measures:
+                _output[m][i] = _measures[m]
+        return(_output)
+    def dice(_histogram):
+        '''
+        compute dice coefficient for all ROIs
+
+        output:
+            1 = perfect agreement
+        '''
+        import numpy
+        with numpy.errstate(divide = 'ignore', invalid = 'ignore'):
+            return(_histogram['intersection'] * 2.0 / numpy.sum(_histogram['volume'], axis = 0))
+    def volume_difference(_histogram):
+        '''
+        compute volume difference for all ROIs
+        as defined as difference in volume divided by volume of first label image
+        '''
+        import numpy
+        _volume = _histogram['volume']
+        with numpy.errstate(divide = 'ignore', invalid = 'ignore'):
+            return((_volume[0] - _volume[1]) / _volume[0])
+    def measure_euclid_distance(_histogram):
+        '''
+        compute euclidean distance between center-of-gravities for all ROIs
+        '''
+        import numpy
+        with numpy.errstate(divide = 'ignore', invalid = 'ignore'):
+            _cog = _histogram['coordinates'] / _histogram['volume'][:, :, None]
+        return(numpy.linalg.norm(_cog[0] - _cog[1], axis = 1))
+
+
+class overlap:
+    '''
+    class object computing overlap agreement measures for binary volumes
+    from true positive, false positive, false negative and true negative counts
+    '''
+    def __init__(self):
+        '''
+        intialization of overlap measure class
+        '''
+    def get_counts(_array1, _array2, _batch = False):
+        '''
+        compute confusion counts for two binary volumes with boolean reductions
+
+        ---
+        input:
+            numpy arrays of same dimensions, _array1 used as reference
+            [optional] _batch = True if first axis indexes subject pairs
+        output:
+            numpy array [TP, FP, FN, TN] (subjects x 4 if _batch)
+        '''
+        import numpy
+        _x = numpy.asarray(_array1).astype(bool, copy = False)
+        _y = numpy.asarray(_array2).astype(bool, copy = False)
+        if _batch:
+            _x = _x.reshape(_x.shape[0], -1)
+            _y = _y.reshape(_y.shape[0], -1)
+            _axis = 1
+        else:
+            _axis = None
+        _tp = numpy.count_nonzero(_x & _y, axis = _axis)
+        _n1 = numpy.count_nonzero(_x, axis = _axis)
+        _n2 = numpy.count_nonzero(_y, axis = _axis)
+        _size = _x.shape[-1] if _batch else _x.size
+        return(numpy.stack([_tp, _n2 - _tp, _n1 - _tp, _size - _n1 - _n2 + _tp], axis = -1))
+    def get_counts_batch(_arrays1, _arrays2):
+        '''
+        compute confusion counts for many subject pairs at once
+
+        ---
+        input:
+            stacked numpy arrays (subjects x volume) or lists of subject volumes
+        output:
+            numpy array subjects x [TP, FP, FN, TN]
+        '''
+        import numpy
+        if isinstance(_arrays1, numpy.ndarray) and isinstance(_arrays2, numpy.ndarray):
+            return(overlap.get_counts(_arrays1, _arrays2, _batch = True))
+        return(numpy.array([ overlap.get_counts(x, y) for x, y in zip(_arrays1, _arrays2) ]).reshape(-1, 4))
+    def dice(_counts):
+        '''
+        compute dice coefficient from confusion counts
+
+        output:
+            1 = perfect agreement
+        '''
+        import numpy
+        _tp, _fp, _fn = numpy.moveaxis(numpy.asarray(_counts, dtype = float), -1, 0)[:3]
+        with numpy.errstate(divide = 'ignore', invalid = 'ignore'):
+            return(2.0 * _tp / (2.0 * _tp + _fp + _fn))
+    def jaccard(_counts):
+        '''
+        compute jaccard score from confusion counts
+        '''
+        import numpy
+        _tp, _fp, _fn = numpy.moveaxis(numpy.asarray(_counts, dtype = float), -1, 0)[:3]
+        with numpy.errstate(divide = 'ignore', invalid = 'ignore'):
+            return(_tp / (_tp + _fp + _fn))
+    def volume_difference(_counts):
+        '''
+        compute volume difference from confusion counts
+        as defined as difference in volume divided by volume of reference
+        '''
+        import numpy
+        _tp, _fp, _fn = numpy.moveaxis(numpy.asarray(_counts, dtype = float), -1, 0)[:3]
+        with numpy.errstate(divide = 'ignore', invalid = 'ignore'):
+            return((_fn - _fp) / (_tp + _fn))
+    def sensitivity(_counts):
+        '''
+        compute sensitivity (true positive rate) from confusion counts
+        '''
+        import numpy
+        _tp, _fp, _fn = numpy.moveaxis(numpy.asarray(_counts, dtype = float), -1, 0)[:3]
+        with numpy.errstate(divide = 'ignore', invalid = 'ignore'):
+            return(_tp / (_tp + _fn))
+    def precision(_counts):
+        '''
+        compute precision (positive predictive value) from confusion counts
+        '''
+        import numpy
+        _tp, _fp, _fn = numpy.moveaxis(numpy.asarray(_counts, dtype = float), -1, 0)[:3]
+        with numpy.errstate(divide = 'ignore', invalid = 'ignore'):
+            return(_tp / (_tp + _fp))
+
+
+class surface:
+    '''
+    class object computing surface distance agreement measures
+    (symmetric hausdorff, 95th percentile hausdorff, average symmetric surface distance)
+    for binary volumes using euclidean distance transforms
+    '''
+    measures = ['hausdorff', 'hausdorff95', 'assd', 'hausdorff_mm', 'hausdorff95_mm', 'assd_mm']
+    def __init__(self):
+        '''
+        intialization of surface measure class
+        '''
+    def get_bbox(_array1, _array2, _margin = 1):
+        '''
+        return slices of bounding box around nonzero elements of both arrays
+        extended by _margin voxels
+        '''
+        import numpy
+        _union = numpy.logical_or(_array1, _array2)
+        _slices = []
+        for a in range(_union.ndim):
+            _any = numpy.flatnonzero(numpy.any(_union, axis = tuple(i for i in range(_union.ndim) if i != a)))
+            if len(_any) == 0:
+                return(None)
+            _slices.append(slice(max(_any[0] - _margin, 0), min(_any[-1] + _margin + 1, _union.shape[a])))
+        return(tuple(_slices))
+    def get_border(_mask):
+        '''
+        extract boundary voxels of binary mask
+        '''
+        import scipy.ndimage
+        return(_mask & ~scipy.ndimage.binary_erosion(_mask, border_value = 0))
+    def get_distances(_border1, _border2, _spacing = None):
+        '''
+        compute distances from each boundary voxel to the other boundary
+
+        ---
+        input:
+            boolean boundary arrays of same dimensions
+            [optional] _spacing voxel sizes, default = voxel units
+        output:
+            directed distances border1 > border2 and border2 > border1
+        '''
+        import scipy.ndimage
+        _distance12 = scipy.ndimage.distance_transform_edt(~_border2, sampling = _spacing)[_border1]
+        _distance21 = scipy.ndimage.distance_transform_edt(~_border1, sampling = _spacing)[_border2]
+        return(_distance12, _distance21)
+    def get_summary(_distance12, _distance21):
+        '''
+        summarize directed surface distances into
+        symmetric hausdorff, 95th percentile hausdorff and average symmetric surface distance
+        '''
+        import numpy
+        return([ max(_distance12.max(), _distance21.max()),
+            max(numpy.percentile(_distance12, 95), numpy.percentile(_distance21, 95)),
+            (_distance12.sum() + _distance21.sum()) / (len(_distance12) + len(_distance21)) ])
+    def get_measures(_array1, _array2, _spacing = None):
+        '''
+        compute surface distance measures for two binary volumes
+        restricted to the bounding box of both volumes
+
+        ---
+        input:
+            numpy arrays of same dimensions
+            [optional] _spacing voxel sizes in mm (e.g. io.get_spacing(filename))
+        output:
+            dictionary of measures in voxel and mm units, nan if either volume is empty
+        '''
+        import numpy
+        _output = dict([ (m, numpy.nan) for m in surface.measures ])
+        _x = numpy.asarray(_array1).astype(bool, copy = False)
+        _y = numpy.asarray(_array2).astype(bool, copy = False)
+        _bbox = surface.get_bbox(_x, _y)
+        if _bbox is None or not _x.any() or not _y.any():
+            return(_output)
+        _border1 = surface.get_border(_x[_bbox])
+        _border2 = surface.get_border(_y[_bbox])
+        _voxel = surface.get_summary(*surface.get_distances(_border1, _border2))
+        if _spacing is None or numpy.allclose(_spacing, 1):
+            _mm = _voxel
+        else:
+            _mm = surface.get_summary(*surface.get_distances(_border1, _border2, _spacing))
+        for m, value in zip(surface.measures, _voxel + _mm):
+            _output[m] = value
+        return(_output)
+
+
+class batch:
+    '''
+    class object computing connectome agreement measures for all subjects at once
+    given two stacks (subjects x N x N) or vectorized stacks (subjects x edges)
+    '''
+    def __init__(self):
+        '''
+        intialization of batch agreement class
+        '''
+    def vectorize(_stack):
+        '''
+        return subjects x edges array of upper triangle entries (including diagonal)
+        for stack of matrices, vectorized stacks are returned as float arrays
+        '''
+        import numpy
+        _stack = numpy.asarray(_stack, dtype = float)
+        if _stack.ndim == 2:
+            return(_stack)
+        _rows, _cols = transform.get_triu(_stack.shape[1])
+        return(_stack[:, _rows, _cols])
+    def measure_pearson(_stack1, _stack2):
+        '''
+        compute pearson correlation between vectorized matrices for each subject
+        '''
+        import numpy
+        _x = batch.vectorize(_stack1)
+        _y = batch.vectorize(_stack2)
+        _x = _x - _x.mean(axis = 1, keepdims = True)
+        _y = _y - _y.mean(axis = 1, keepdims = True)
+        return(numpy.einsum('ij,ij->i', _x, _y) / numpy.sqrt(numpy.einsum('ij,ij->i', _x, _x) * numpy.einsum('ij,ij->i', _y, _y)))
+    def measure_spearman(_stack1, _stack2):
+        '''
+        compute spearman rank correlation between vectorized matrices for each subject
+        '''
+        import scipy.stats
+        return(batch.measure_pearson(scipy.stats.rankdata(batch.vectorize(_stack1), axis = 1),
+            scipy.stats.rankdata(batch.vectorize(_stack2), axis = 1)))
+    def measure_euclidean(_stack1, _stack2):
+        '''
+        compute euclidean distance between vectorized matrices for each subject
+        '''
+        import numpy
+        return(numpy.linalg.norm(batch.vectorize(_stack1) - batch.vectorize(_stack2), axis = 1))
+    def measure_hausdorff(_stack1, _stack2):
+        '''
+        compute directed hausdorff distance between matrices for each subject
+        treating matrix rows as points (as agreement.measure_hausdorff),
+        pairwise distances are obtained by batched matrix products
+
+        ---
+        input:
+            stacks of matrices subjects x N x M
+        '''
+        import numpy
+        _x = numpy.asarray(_stack1, dtype = float)
+        _y = numpy.asarray(_stack2, dtype = float)
+        _distance = numpy.sum(_x**2, axis = 2)[:, :, None] + numpy.sum(_y**2, axis = 2)[:, None, :] - 2 * numpy.matmul(_x, _y.transpose(0, 2, 1))
+        return(numpy.sqrt(numpy.maximum(numpy.max(numpy.min(_distance, axis = 2), axis = 1), 0)))
+
+
+class identifiability:
+    '''
+    class object computing the subject x subject connectome similarity matrix
+    and identifiability measures (Amico & Goni, 2018) between two groups
+    '''
+    def __init__(self):
+        '''
+        intialization of identifiability class
+        '''
+    def get_vectors(_stack, _rows):
+        '''
+        return z-scored upper triangle entries (without diagonal)
+        for given rows of a stack (subjects x N x N or subjects x edges)
+        '''
+        import numpy
+        _vectors = numpy.asarray(_stack[_rows], dtype = float)
+        if _vectors.ndim == 3:
+            _rows, _cols = transform.get_triu(_vectors.shape[1], 1)
+            _vectors = _vectors[:, _rows, _cols]
+        _vectors -= _vectors.mean(axis = 1, keepdims = True)
+        _vectors /= _vectors.std(axis = 1, keepdims = True)
+        return(_vectors)
+    def get_similarity(_stack1, _stack2, _rows1 = None, _rows2 = None, _tile = None):
+        '''
+        compute pearson correlation of every subject in _stack1 with
+        every subject in _stack2 as single matrix product of z-scored vectors,
+        computed in tiles of _tile subjects for bounded memory
+
+        ---
+        input:
+            stacks (subjects x N x N or subjects x edges), e.g. memory-mapped store data
+            [optional] _rows1, _rows2 subject rows to use, default = all
+            [optional] _tile number of subjects held in memory per group, default = all
+        output:
+            numpy array subjects1 x subjects2
+        '''
+        import numpy
+        _rows1 = numpy.arange(len(_stack1)) if _rows1 is None else numpy.asarray(_rows1)
+        _rows2 = numpy.arange(len(_stack2)) if _rows2 is None else numpy.asarray(_rows2)
+        _tile = max(len(_rows1), len(_rows2)) if not _tile else int(_tile)
+        _similarity = numpy.zeros([len(_rows1), len(_rows2)])
+        for i in range(0, len(_rows1), _tile):
+            _z1 = identifiability.get_vectors(_stack1, _rows1[i:i+_tile])
+            for j in range(0, len(_rows2), _tile):
+                _z2 = identifiability.get_vectors(_stack2, _rows2[j:j+_tile])
+                _similarity[i:i+_tile, j:j+_tile] = numpy.dot(_z1, _z2.T) / _z1.shape[1]
+        return(_similarity)
+    def get_measures(_similarity):
+        '''
+        compute identifiability measures from square similarity matrix
+        with matched subjects on the diagonal
+
+        output:
+            dictionary of self identifiability (Iself), others identifiability (Iothers),
+            differential identifiability (Idiff) and identification accuracy in both directions
+        '''
+        import numpy
+        _n = _similarity.shape[0]
+        _diagonal = numpy.diag(_similarity)
+        _output = dict()
+        _output['Iself'] = numpy.mean(_diagonal)
+        _output['Iothers'] = (numpy.sum(_similarity) - numpy.sum(_diagonal)) / (_n * (_n - 1))
+        _output['Idiff'] = 100 * (_output['Iself'] - _output['Iothers'])
+        _output['accuracy_rows'] = numpy.mean(numpy.argmax(_similarity, axis = 1) == numpy.arange(_n))
+        _output['accuracy_columns'] = numpy.mean(numpy.argmax(_similarity, axis = 0) == numpy.arange(_n))
+        return(_output)
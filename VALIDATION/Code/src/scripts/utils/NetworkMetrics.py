@@ -31,25 +31,541 @@
 
 
 
+class native:
+    '''
+    array native graph algorithms operating directly on
+    weighted adjacency matrices, absolute edge weights are used as path lengths
+    (as networkx weight = 'length', see network._graph)
+    '''
+    def __init__(self):
+        '''
+        initialization of native backend class
+        '''
+    def get_sparse(_matrix, _threshold = None):
+        '''
+        return compressed sparse row adjacency (float64 weights, int32 indices)
+        built directly from the non-zero, non-nan entries of a dense or sparse matrix,
+        weights are kept in double precision so shortest path ties resolve as in networkx
+
+        ---
+        input:
+            numpy.array or scipy.sparse adjacency matrix
+            [optional] _threshold absolute edge weight threshold
+        output:
+            scipy.sparse.csr_matrix
+        '''
+        import numpy, scipy.sparse
+        if scipy.sparse.issparse(_matrix):
+            _coo = _matrix.tocoo()
+            _order = numpy.lexsort((_coo.col, _coo.row))
+            _rows, _cols, _data = _coo.row[_order], _coo.col[_order], _coo.data[_order]
+        else:
+            _rows, _cols = numpy.nonzero(_matrix)
+            _data = numpy.asarray(_matrix)[_rows, _cols]
+        _keep = (_data == _data) & (_data != 0)
+        if _threshold:
+            _keep &= abs(_data) >= _threshold
+        _rows, _cols, _data = _rows[_keep], _cols[_keep], _data[_keep]
+        _pointer = numpy.concatenate([[0], numpy.cumsum(numpy.bincount(_rows, minlength = _matrix.shape[0]))])
+        return(scipy.sparse.csr_matrix((_data.astype(numpy.float64), _cols.astype(numpy.int32), _pointer.astype(numpy.int32)), shape = _matrix.shape))
+    def get_dense(_matrix):
+        '''
+        return dense float adjacency matrix of dense or sparse input
+        '''
+        import numpy, scipy.sparse
+        if scipy.sparse.issparse(_matrix):
+            return(_matrix.toarray().astype(float))
+        return(numpy.asarray(_matrix, dtype = float))
+    def get_edges(_matrix):
+        '''
+        return source, target and weight arrays of all edges excluding self-loops
+        '''
+        import numpy, scipy.sparse
+        if scipy.sparse.issparse(_matrix):
+            _coo = _matrix.tocoo()
+            _keep = (_coo.row != _coo.col) & (_coo.data != 0)
+            return(_coo.row[_keep].astype(int), _coo.col[_keep].astype(int), _coo.data[_keep].astype(float))
+        _source, _target = numpy.nonzero(_matrix)
+        _keep = _source != _target
+        _source, _target = _source[_keep], _target[_keep]
+        return(_source, _target, _matrix[_source, _target])
+    def strength(_matrix):
+        '''
+        compute weighted node degree, self-loops counted twice (as networkx)
+        '''
+        import numpy, scipy.sparse
+        if scipy.sparse.issparse(_matrix):
+            return(numpy.asarray(_matrix.sum(axis = 1), dtype = float).ravel() + _matrix.diagonal())
+        return(numpy.sum(_matrix, axis = 1) + numpy.diag(_matrix))
+    def distance(_matrix):
+        '''
+        compute all pairs weighted shortest path lengths using dijkstra,
+        stacks of matrices (subjects x N x N) use batched floyd-warshall.
+        absolute edge weights are used as lengths, so negative weights
+        (e.g. anticorrelations) are valid
+        '''
+        import numpy, scipy.sparse, scipy.sparse.csgraph
+        if numpy.ndim(_matrix) == 3:
+            return(native.distance_stack(_matrix))
+        _source, _target, _weight = native.get_edges(_matrix)
+        _graph = scipy.sparse.csr_matrix((abs(_weight), (_source, _target)), shape = _matrix.shape)
+        return(scipy.sparse.csgraph.shortest_path(_graph, method = 'D', directed = False))
+    def distance_stack(_stack):
+        '''
+        compute all pairs weighted shortest path lengths for a stack of
+        matrices (subjects x N x N) with floyd-warshall vectorized over subjects
+        '''
+        import numpy
+        _stack = abs(numpy.array(_stack, dtype = float))
+        _nodes = numpy.arange(_stack.shape[-1])
+        _stack[:, _nodes, _nodes] = 0
+        _distance = numpy.where(_stack != 0, _stack, numpy.inf)
+        _distance[:, _nodes, _nodes] = 0
+        for k in _nodes:
+            numpy.minimum(_distance, _distance[:, :, k, None] + _distance[:, None, k, :], out = _distance)
+        return(_distance)
+    def betweenness(_matrix, _distance = None, _normalized = True, _tolerance = 0):
+        '''
+        compute weighted betweenness centrality via brandes accumulation
+        expressed as two triangular solves per source node
+
+        ---
+        input:
+            numpy.array symmetrical adjacency matrix
+            [optional] _distance precomputed shortest path lengths
+            [optional] _normalized by (n-1)(n-2), default = True
+            [optional] _tolerance relative tolerance for equal path lengths,
+                       default = exact comparison (as networkx)
+        output:
+            numpy.array of node betweenness
+        '''
+        import numpy, scipy.linalg
+        _n = _matrix.shape[0]
+        if _distance is None:
+            _distance = native.distance(_matrix)
+        _source, _target, _weight = native.get_edges(_matrix)
+        _weight = abs(_weight)
+        _between = numpy.zeros(_n)
+        for s in range(_n):
+            _dist = _distance[s]
+            _nodes = numpy.flatnonzero(numpy.isfinite(_dist))
+            _nodes = _nodes[numpy.argsort(_dist[_nodes], kind = 'stable')]
+            _position = numpy.full(_n, -1)
+            _position[_nodes] = numpy.arange(len(_nodes))
+            with numpy.errstate(invalid = 'ignore'):
+                _tight = numpy.isfinite(_dist[_source]) & (abs(_dist[_source] + _weight - _dist[_target]) <= _tolerance * numpy.maximum(1, abs(_dist[_target])))
+            _pred = numpy.zeros([len(_nodes), len(_nodes)])
+            _pred[_position[_source[_tight]], _position[_target[_tight]]] = 1
+            _unit = numpy.zeros(len(_nodes))
+            _unit[0] = 1
+            _sigma = scipy.linalg.solve_triangular(numpy.eye(len(_nodes)) - _pred.T, _unit, lower = True, unit_diagonal = True)
+            _x = scipy.linalg.solve_triangular(numpy.eye(len(_nodes)) - _pred, 1 / _sigma, lower = False, unit_diagonal = True)
+            _delta = _sigma * _x - 1
+            _delta[0] = 0
+            _between[_nodes] += _delta
+        if _normalized and _n > 2:
+            _between = _between / ((_n - 1) * (_n - 2))
+        elif not _normalized:
+            _between = _between / 2
+        return(_between)
+    def clustering(_matrix, _weighted = True):
+        '''
+        compute exact local clustering coefficient, weighted version
+        following Onnela et al. 2005 using cube root of max normalized
+        weights (as networkx.clustering with weight = 'weight')
+
+        ---
+        input:
+            numpy.array adjacency matrix or stack of matrices (subjects x N x N)
+            [optional] _weighted clustering, default = True
+        output:
+            numpy.array of node clustering (N) or (subjects x N)
+        '''
+        import numpy, scipy.sparse
+        if scipy.sparse.issparse(_matrix):
+            _adjacency = scipy.sparse.csr_matrix(_matrix, dtype = float, copy = True)
+            _max = numpy.max(_adjacency.data) if _adjacency.nnz else 1
+            _adjacency.setdiag(0)
+            _adjacency.eliminate_zeros()
+            _cube = _adjacency.copy()
+            _cube.data = numpy.cbrt(_cube.data / _max) if _weighted else numpy.ones(_cube.nnz)
+            _degree = numpy.diff(_adjacency.indptr)
+            _triangles = numpy.asarray(_cube.dot(_cube).multiply(_cube).sum(axis = 1)).ravel()
+            with numpy.errstate(divide = 'ignore', invalid = 'ignore'):
+                return(numpy.where(_degree > 1, _triangles / (_degree * (_degree - 1)), 0))
+        _stack = numpy.array(_matrix, dtype = float, ndmin = 3)
+        _nodes = numpy.arange(_stack.shape[-1])
+        _nonzero = _stack != 0
+        _nonzero[:, _nodes, _nodes] = False
+        if _weighted:
+            _max = numpy.max(numpy.where(_stack != 0, _stack, -numpy.inf), axis = (1, 2))
+            _max = numpy.where(numpy.isfinite(_max), _max, 1)
+            _cube = numpy.cbrt(_stack / _max[:, None, None])
+            _cube[:, _nodes, _nodes] = 0
+        else:
+            _cube = _nonzero.astype(float)
+        _degree = numpy.sum(_nonzero, axis = 2)
+        _triangles = numpy.sum(numpy.matmul(_cube, _cube) * _cube, axis = 2)
+        with numpy.errstate(divide = 'ignore', invalid = 'ignore'):
+            _clustering = numpy.where(_degree > 1, _triangles / (_degree * (_degree - 1)), 0)
+        return(_clustering.reshape(numpy.shape(_matrix)[:-1]))
+    def short_path(_matrix, _distance = None):
+        '''
+        compute average weighted shortest path length of connected graph
+        '''
+        import numpy
+        _n = _matrix.shape[0]
+        if _distance is None:
+            _distance = native.distance(_matrix)
+        if not numpy.all(numpy.isfinite(_distance)):
+            raise ValueError('Graph is not connected.')
+        return(numpy.sum(_distance) / (_n * (_n - 1)))
+    def nodal_efficiency(_matrix, _distance = None):
+        '''
+        compute mean inverse shortest path length of each node to all other
+        nodes, unreachable pairs contribute zero
+
+        ---
+        input:
+            numpy.array adjacency matrix or stack of matrices (subjects x N x N)
+            [optional] _distance precomputed shortest path lengths
+        output:
+            numpy.array of nodal efficiency (N) or (subjects x N)
+        '''
+        import numpy
+        if _distance is None:
+            _distance = native.distance(_matrix)
+        _n = _distance.shape[-1]
+        with numpy.errstate(divide = 'ignore'):
+            _inverse = 1 / _distance
+        _inverse[..., numpy.arange(_n), numpy.arange(_n)] = 0
+        return(numpy.sum(_inverse, axis = -1) / max(_n - 1, 1))
+    def efficiency(_matrix, _distance = None):
+        '''
+        compute global efficiency, valid for disconnected graphs
+        '''
+        import numpy
+        return(numpy.mean(native.nodal_efficiency(_matrix, _distance), axis = -1))
+    def char_path(_matrix, _distance = None):
+        '''
+        compute characteristic path length as harmonic mean of shortest
+        path lengths, infinite for graphs without any edge
+        '''
+        import numpy
+        with numpy.errstate(divide = 'ignore'):
+            return(1 / native.efficiency(_matrix, _distance))
+    def local_efficiency(_matrix):
+        '''
+        compute local efficiency as global efficiency of the subgraph
+        induced by the neighbours of each node (Latora & Marchiori 2001)
+
+        ---
+        input:
+            numpy.array adjacency matrix or stack of matrices (subjects x N x N)
+        output:
+            numpy.array of local efficiency (N) or (subjects x N)
+        '''
+        import numpy
+        if numpy.ndim(_matrix) == 3:
+            return(numpy.array([native.local_efficiency(m) for m in _matrix]))
+        _matrix = native.get_sparse(_matrix)
+        _local = numpy.zeros(_matrix.shape[0])
+        for i in range(_matrix.shape[0]):
+            _neighbours = _matrix.indices[_matrix.indptr[i]:_matrix.indptr[i + 1]]
+            _neighbours = _neighbours[_neighbours != i]
+            if len(_neighbours) > 1:
+                _local[i] = native.efficiency(_matrix[_neighbours][:, _neighbours])
+        return(_local)
+    def communicability(_matrix):
+        '''
+        compute weighted communicability as matrix exponential of strength
+        normalized weights, exp(D^-1/2 W D^-1/2) (Crofts & Higham 2009),
+        evaluated by eigendecomposition to allow batches of matrices
+
+        ---
+        input:
+            numpy.array symmetrical adjacency matrix or stack (subjects x N x N)
+        output:
+            numpy.array communicability matrix (N x N) or (subjects x N x N)
+        '''
+        import numpy
+        _stack = native.get_dense(_matrix).copy()
+        _nodes = numpy.arange(_stack.shape[-1])
+        _stack[..., _nodes, _nodes] = 0
+        _strength = numpy.sum(_stack, axis = -1)
+        with numpy.errstate(divide = 'ignore', invalid = 'ignore'):
+            _scale = numpy.where(_strength > 0, 1 / numpy.sqrt(_strength), 0)
+        _normalized = _scale[..., :, None] * _stack * _scale[..., None, :]
+        _values, _vectors = numpy.linalg.eigh(_normalized)
+        return(numpy.matmul(_vectors * numpy.exp(_values)[..., None, :], numpy.swapaxes(_vectors, -1, -2)))
+    def nodal_communicability(_matrix):
+        '''
+        compute mean communicability of each node to all other nodes
+        '''
+        import numpy
+        _communicability = native.communicability(_matrix)
+        _n = _communicability.shape[-1]
+        _communicability[..., numpy.arange(_n), numpy.arange(_n)] = 0
+        return(numpy.sum(_communicability, axis = -1) / max(_n - 1, 1))
+    def rich_club(_matrix):
+        '''
+        compute unweighted rich club coefficient for all degree levels k,
+        fraction of existing edges among nodes with degree > k
+
+        ---
+        input:
+            numpy.array symmetrical adjacency matrix
+        output:
+            numpy.array rich club coefficient per degree k = 0 ... max(degree) - 1
+        '''
+        import numpy
+        _matrix = native.get_dense(_matrix)
+        _source, _target, _ = native.get_edges(numpy.triu(_matrix))
+        _degree = numpy.sum(_matrix != 0, axis = 1) - (numpy.diag(_matrix) != 0)
+        _levels = numpy.arange(max(numpy.max(_degree), 1))
+        _edges = numpy.cumsum(numpy.bincount(numpy.minimum(_degree[_source], _degree[_target]), minlength = len(_levels) + 1)[::-1])[::-1][1:len(_levels) + 1]
+        _nodes = numpy.cumsum(numpy.bincount(_degree, minlength = len(_levels) + 1)[::-1])[::-1][1:len(_levels) + 1]
+        with numpy.errstate(divide = 'ignore', invalid = 'ignore'):
+            return(numpy.where(_nodes > 1, 2 * _edges / (_nodes * (_nodes - 1)), numpy.nan))
+    def smallworld(_matrix, _random, _lattice):
+        '''
+        compute small world coefficients sigma and omega of binary graph
+        (as networkx.smallworld) given random and lattice reference stacks
+
+        ---
+        input:
+            numpy.array symmetrical adjacency matrix
+            _random stack of random surrogates (count x N x N)
+            _lattice stack of lattice surrogates (count x N x N)
+        output:
+            tuple of sigma, omega
+        '''
+        import numpy
+        _binary = lambda x: (native.get_dense(x) != 0).astype(float)
+        _C = numpy.mean(native.clustering(_binary(_matrix), _weighted = False))
+        _L = native.short_path(_binary(_matrix))
+        _Cr = numpy.mean(native.clustering(_binary(_random), _weighted = False))
+        _Lr = numpy.mean([native.short_path(_binary(x)) for x in _random])
+        _Cl = numpy.mean(native.clustering(_binary(_lattice), _weighted = False))
+        return((_C / _Cr) / (_L / _Lr), _Lr / _L - _C / _Cl)
+
+
+class nullmodel:
+    '''
+    vectorized, seedable null model generation for undirected
+    adjacency matrices with optional disk cache of binary surrogates
+    '''
+    cachedir = None
+    workers = 1
+    seed = 0
+    swaps = 10
+    def __init__(self):
+        '''
+        initialization of null model class
+        '''
+    def set_options(_cachedir = None, _workers = None, _seed = None, _swaps = None):
+        '''
+        set surrogate cache directory, number of parallel workers,
+        base seed and number of swaps per edge
+        '''
+        nullmodel.cachedir = _cachedir
+        if _workers is not None:
+            nullmodel.workers = _workers
+        if _seed is not None:
+            nullmodel.seed = _seed
+        if _swaps is not None:
+            nullmodel.swaps = _swaps
+    def get_key(_matrix, *_params):
+        '''
+        return hash of matrix content and generation parameters
+        '''
+        import hashlib, numpy
+        _hash = hashlib.sha1(numpy.ascontiguousarray(_matrix, dtype = float).tobytes())
+        _hash.update(str(_matrix.shape).encode())
+        _hash.update(str(_params).encode())
+        return(_hash.hexdigest())
+    def is_connected(_adjacency):
+        '''
+        check whether binary adjacency matrix forms a single component
+        '''
+        import scipy.sparse, scipy.sparse.csgraph
+        return(scipy.sparse.csgraph.connected_components(scipy.sparse.csr_matrix(_adjacency), directed = False)[0] == 1)
+    def randomize(_matrix, _seed = None, _swaps = 10, _strength = False, _connected = True):
+        '''
+        degree preserving randomization by double edge swaps (Maslov & Sneppen 2002),
+        all swaps of one round are drawn at once and only non-conflicting swaps are applied
+
+        ---
+        input:
+            numpy.array symmetrical adjacency matrix
+            [optional] _seed numpy.random.SeedSequence or integer
+            [optional] _swaps attempted swaps per edge, default = 10
+            [optional] _strength reassign weights to approximately preserve node strength
+            [optional] _connected reject rounds disconnecting the graph, default = True
+        output:
+            numpy.array randomized adjacency matrix
+        '''
+        import numpy
+        _rng = numpy.random.default_rng(_seed)
+        _n = _matrix.shape[0]
+        _source, _target = numpy.nonzero(numpy.triu(_matrix, 1))
+        _weight = _matrix[_source, _target]
+        _adjacency = numpy.zeros([_n, _n], dtype = bool)
+        _adjacency[_source, _target] = _adjacency[_target, _source] = True
+        _connected = _connected and nullmodel.is_connected(_adjacency)
+        _edges = len(_source)
+        for _ in range(2 * _swaps if _edges > 1 else 0):
+            _order = _rng.permutation(_edges)
+            _first, _second = _order[:_edges // 2], _order[_edges // 2:2 * (_edges // 2)]
+            _flip = _rng.random(len(_first)) < 0.5
+            _a, _b = _source[_first], _target[_first]
+            _c = numpy.where(_flip, _target[_second], _source[_second])
+            _d = numpy.where(_flip, _source[_second], _target[_second])
+            _valid = (_a != _d) & (_c != _b) & ~_adjacency[_a, _d] & ~_adjacency[_c, _b]
+            _keys = numpy.concatenate([numpy.minimum(_a, _d) * _n + numpy.maximum(_a, _d), numpy.minimum(_c, _b) * _n + numpy.maximum(_c, _b)])
+            _unique, _inverse, _counts = numpy.unique(_keys[numpy.tile(_valid, 2)], return_inverse = True, return_counts = True)
+            _valid[_valid] = (_counts[_inverse] == 1).reshape(2, -1).all(axis = 0)
+            if not numpy.any(_valid):
+                continue
+            _a, _b, _c, _d = _a[_valid], _b[_valid], _c[_valid], _d[_valid]
+            _first, _second = _first[_valid], _second[_valid]
+            _update = _adjacency.copy()
+            _update[_a, _b] = _update[_b, _a] = _update[_c, _d] = _update[_d, _c] = False
+            _update[_a, _d] = _update[_d, _a] = _update[_c, _b] = _update[_b, _c] = True
+            if _connected and not nullmodel.is_connected(_update):
+                continue
+            _adjacency = _update
+            _target[_first], _source[_second], _target[_second] = _d, _c, _b
+        _random = numpy.zeros([_n, _n])
+        if _strength and _edges:
+            _expected = numpy.sum(abs(_matrix), axis = 1) - abs(numpy.diag(_matrix))
+            _weight = numpy.sort(_weight)[numpy.argsort(numpy.argsort(_expected[_source] * _expected[_target]))]
+        _random[_source, _target] = _random[_target, _source] = _weight
+        return(_random)
+    def latticize(_matrix):
+        '''
+        ring lattice reference with equal number of edges,
+        largest weights placed nearest to the diagonal
+
+        ---
+        input:
+            numpy.array symmetrical adjacency matrix
+        output:
+            numpy.array lattice adjacency matrix
+        '''
+        import numpy
+        _n = _matrix.shape[0]
+        _weight = numpy.sort(_matrix[numpy.triu_indices(_n, 1)])
+        _weight = _weight[_weight != 0][::-1]
+        _source, _target = numpy.triu_indices(_n, 1)
+        _ring = numpy.minimum(_target - _source, _n - (_target - _source))
+        _order = numpy.lexsort((_source, _ring))[:len(_weight)]
+        _lattice = numpy.zeros([_n, _n])
+        _lattice[_source[_order], _target[_order]] = _lattice[_target[_order], _source[_order]] = _weight
+        return(_lattice)
+    def get_surrogates(_matrix, _count = 10, _kind = 'random', _strength = False, _cache = True):
+        '''
+        generate or load cached stack of random surrogates for adjacency matrix,
+        surrogates are generated in parallel from independent seed streams,
+        binary surrogates are returned as boolean stack and only these are
+        written to disk if a cache directory is set
+
+        ---
+        input:
+            numpy.array symmetrical adjacency matrix
+            [optional] _count number of surrogates, default = 10
+            [optional] _kind <random> or <lattice>
+            [optional] _strength preserve strength in random surrogates
+            [optional] _cache use disk cache if cache directory is set, default = True
+        output:
+            numpy.array stack of surrogates (count x N x N), boolean unless _strength
+        '''
+        import os, tempfile, numpy
+        from utils.Utility import scheduler
+        if _kind == 'lattice':
+            return(nullmodel.latticize(_matrix)[None])
+        _key = nullmodel.get_key(_matrix, _count, nullmodel.seed, nullmodel.swaps, _strength)
+        _cache = _cache and bool(nullmodel.cachedir) and not _strength
+        if _cache:
+            _file = os.path.join(nullmodel.cachedir, 'surrogates.' + _key[:16] + '.npy')
+            if os.path.isfile(_file):
+                return(numpy.load(_file, mmap_mode = 'r'))
+        _seeds = numpy.random.SeedSequence([nullmodel.seed, int(_key[:8], 16)]).spawn(_count)
+        _stack = numpy.stack(scheduler.run(nullmodel.randomize, [(seed, nullmodel.swaps, _strength) for seed in _seeds],
+            _workers = nullmodel.workers, _shared = (_matrix,)))
+        if not _strength:
+            _stack = _stack != 0
+        if _cache:
+            os.makedirs(nullmodel.cachedir, exist_ok = True)
+            _handle, _temp = tempfile.mkstemp(dir = nullmodel.cachedir, suffix = '.npy')
+            with os.fdopen(_handle, 'wb') as f:
+                numpy.save(f, _stack)
+            os.replace(_temp, _file)
+        return(_stack)
+    def normalize(_function, _matrix, _surrogates):
+        '''
+        return metric of matrix normalized by mean metric across surrogates
+        '''
+        import numpy, warnings
+        _reference = [numpy.asarray(_function(numpy.asarray(x)), dtype = float) for x in _surrogates]
+        _metric = numpy.asarray(_function(_matrix), dtype = float)
+        _length = max([_metric.size] + [r.size for r in _reference])
+        _pad = lambda x: numpy.pad(numpy.ravel(x), (0, _length - x.size), constant_values = numpy.nan)
+        with numpy.errstate(divide = 'ignore', invalid = 'ignore'), warnings.catch_warnings():
+            warnings.simplefilter('ignore', RuntimeWarning)
+            _result = _pad(_metric) / numpy.nanmean(numpy.stack([_pad(r) for r in _reference]), axis = 0)
+        return(_result.reshape(_metric.shape) if _result.size == _metric.size else _result)
+
+
 class network:
     '''
-    class for network metric computations for a given adjacency matrix
+    class for network metric computations for a given adjacency matrix,
+    the thresholded graph is stored in compressed sparse row format
 
     ---
     Input:
         numpy.array symmetrical adjacency matrix
+        [optional] _threshold absolute edge weight threshold
+        [optional] _backend <numpy> array native computations (default) or <networkx>
+        [optional] _nullcache use disk cache of null model surrogates, default = True
     Output:
 
     '''
-    def __init__(self, _matrix, _threshold = None):
+    def __init__(self, _matrix, _threshold = None, _backend = 'numpy', _nullcache = True):
         '''
         initialization of graph metric object
         '''
-        import networkx, numpy
-        if _threshold:
-            _matrix[abs(_matrix) < _threshold] = 0
-        _cleanmatrix=numpy.where(_matrix!=_matrix,0,_matrix)
-        self._graph = networkx.convert_matrix.from_numpy_matrix(_cleanmatrix)
+        self._matrix = native.get_sparse(_matrix, _threshold)
+        self._backend = _backend
+        self._nullcache = _nullcache
+        self._cache = dict()
+    @property
+    def _graph(self):
+        '''
+        networkx graph of adjacency matrix, built on first access,
+        edge attribute 'length' holds absolute weights used as path lengths
+        '''
+        import networkx
+        if '_nxgraph' not in self.__dict__:
+            if hasattr(networkx, 'from_scipy_sparse_array'):
+                self._nxgraph = networkx.from_scipy_sparse_array(self._matrix)
+            else:
+                self._nxgraph = networkx.from_scipy_sparse_matrix(self._matrix)
+            for _edge in self._nxgraph.edges(data = True):
+                _edge[2]['length'] = abs(_edge[2]['weight'])
+        return(self._nxgraph)
+    def get_cached(self, _key, _function, *_args):
+        '''
+        evaluate _function once per graph and share result between metrics
+        '''
+        if _key not in self._cache:
+            self._cache[_key] = _function(*_args)
+        return(self._cache[_key])
+    def get_distance(self):
+        '''
+        return all pairs weighted shortest path lengths of graph
+        '''
+        return(self.get_cached('distance', native.distance, self._matrix))
 
 
 
@@ -71,34 +587,72 @@ class Global(network):
         get global graph node strength
         '''
         import numpy
-        return(numpy.mean(self._graph.degree(weight='weight')))
+        return(numpy.mean(Local.degree(self)))
     def cluster_coeff(self):
         '''
-        return global cluster coefficient
+        return global weighted cluster coefficient
         '''
-        import networkx.algorithms.approximation
-        return(networkx.algorithms.approximation.clustering_coefficient.average_clustering(self._graph, trials = 100))
+        import numpy
+        return(numpy.mean(Local.cluster_coeff(self)))
     def between_cent(self):
         '''
         compute normalized betweenness centrality
         '''
-        import networkx, numpy
-        return(numpy.mean(list(networkx.centrality.betweenness_centrality(self._graph,
-            k = None, normalized = True, weight = 'weight', endpoints = False, seed = None).values())))
+        import numpy
+        return(numpy.mean(Local.between_cent(self)))
     def smallworldness(self):
         '''
-        compute small worldness of graph
+        compute small world coefficient omega of graph, nan if graph is not connected
         '''
-        import networkx
-        omega = networkx.smallworld.omega(self._graph, niter=100, nrand=10, seed=None)
-        return(omega)
+        return(Global._smallworld(self)[1])
+    def smallworld_sigma(self):
+        '''
+        compute small world coefficient sigma of graph, nan if graph is not connected
+        '''
+        return(Global._smallworld(self)[0])
+    def _smallworld(self):
+        '''
+        compute sigma and omega once from cached null model surrogates
+        for both backends, undefined (nan) for graphs that are not connected
+        '''
+        import numpy
+        _dense = native.get_dense(self._matrix)
+        if not nullmodel.is_connected(_dense != 0):
+            return((numpy.nan, numpy.nan))
+        return(self.get_cached('smallworld', lambda: native.smallworld(self._matrix,
+            nullmodel.get_surrogates(_dense, _kind = 'random', _cache = self._nullcache), nullmodel.get_surrogates(_dense, _kind = 'lattice'))))
     def short_path(self):
         '''
         compute average shortest path
         '''
+        if self._backend == 'numpy':
+            return(native.short_path(self._matrix, self.get_distance()))
         import networkx
-        sp = networkx.shortest_paths.average_shortest_path_length(self._graph, weight='weight', method=None)
+        sp = networkx.shortest_paths.average_shortest_path_length(self._graph, weight='length', method=None)
         return(sp)
+    def efficiency(self):
+        '''
+        compute weighted global efficiency
+        '''
+        import numpy
+        return(numpy.mean(Local.nodal_efficiency(self)))
+    def char_path(self):
+        '''
+        compute characteristic path length as harmonic mean of shortest paths
+        '''
+        return(native.char_path(self._matrix, self.get_distance()))
+    def local_efficiency(self):
+        '''
+        compute mean weighted local efficiency
+        '''
+        import numpy
+        return(numpy.mean(Local.local_efficiency(self)))
+    def communicability(self):
+        '''
+        compute mean weighted communicability between nodes
+        '''
+        import numpy
+        return(numpy.mean(Local.communicability(self)))
 
 
 class Local(network):
@@ -117,11 +671,134 @@ class Local(network):
         get local graph node strength
         '''
         import numpy
-        return(numpy.array(self._graph.degree(weight='weight'))[:,1])
+        if self._backend == 'numpy':
+            return(self.get_cached('degree', native.strength, self._matrix))
+        return(self.get_cached('degree', lambda: numpy.array(self._graph.degree(weight='weight'))[:,1]))
     def between_cent(self):
         '''
         compute normalized betweenness centrality
         '''
-        import networkx, numpy
-        return(numpy.array(list(networkx.centrality.betweenness_centrality(self._graph,
-            k = None, normalized = True, weight = 'weight', endpoints = False, seed = None).values())))
\ No newline at end of file
+        import numpy
+        if self._backend == 'numpy':
+            return(self.get_cached('between_cent', native.betweenness, self._matrix, self.get_distance()))
+        import networkx
+        return(self.get_cached('between_cent', lambda: numpy.array(list(networkx.centrality.betweenness_centrality(self._graph,
+            k = None, normalized = True, weight = 'length', endpoints = False, seed = None).values()))))
+    def cluster_coeff(self):
+        '''
+        compute local weighted cluster coefficient
+        '''
+        import numpy
+        if self._backend == 'numpy':
+            return(self.get_cached('cluster_coeff', native.clustering, self._matrix))
+        import networkx
+        return(self.get_cached('cluster_coeff', lambda: numpy.array(list(networkx.clustering(self._graph, weight = 'weight').values()))))
+    def nodal_efficiency(self):
+        '''
+        compute weighted nodal efficiency
+        '''
+        return(self.get_cached('nodal_efficiency', native.nodal_efficiency, self._matrix, self.get_distance()))
+    def local_efficiency(self):
+        '''
+        compute weighted local efficiency
+        '''
+        return(self.get_cached('local_efficiency', native.local_efficiency, self._matrix))
+    def communicability(self):
+        '''
+        compute nodal weighted communicability
+        '''
+        return(self.get_cached('communicability', native.nodal_communicability, self._matrix))
+
+
+class sweep:
+    '''
+    multi threshold evaluation of network metrics by incremental
+    edge addition in order of decreasing absolute weight
+    '''
+    metrics = ['density', 'mean_degree', 'mean_strength', 'components']
+    def __init__(self):
+        '''
+        initialization of sweep class
+        '''
+    def get_steps(_matrix, _thresholds = None, _densities = None):
+        '''
+        sort edges once and return number of edges present at each step
+
+        ---
+        input:
+            numpy.array symmetrical adjacency matrix
+            [optional] _thresholds list of absolute edge weight thresholds
+            [optional] _densities list of proportional density targets
+        output:
+            source, target, weight of sorted edges, number of edges per step
+        '''
+        import numpy
+        _n = _matrix.shape[0]
+        _source, _target = numpy.triu_indices(_n, 1)
+        _weight = numpy.where(_matrix != _matrix, 0, _matrix)[_source, _target]
+        _order = numpy.argsort(-abs(_weight), kind = 'stable')
+        _order = _order[_weight[_order] != 0]
+        _source, _target, _weight = _source[_order], _target[_order], _weight[_order]
+        if _densities is not None:
+            _counts = numpy.rint(numpy.asarray(_densities, dtype = float) * _n * (_n - 1) / 2).astype(int)
+        else:
+            _counts = numpy.searchsorted(-abs(_weight), -numpy.asarray(_thresholds, dtype = float), side = 'right')
+        return(_source, _target, _weight, numpy.minimum(_counts, len(_source)))
+    def run(_matrix, _thresholds = None, _densities = None, _metrics = [], _backend = 'numpy'):
+        '''
+        add edges incrementally, updating degree, strength, density and
+        connected components (union-find) per step and evaluating heavier
+        Global metrics only at the requested thresholds
+
+        ---
+        input:
+            numpy.array symmetrical adjacency matrix
+            [optional] _thresholds list of absolute edge weight thresholds
+            [optional] _densities list of proportional density targets
+            [optional] _metrics list of Global metrics evaluated per step
+            [optional] _backend graph metric backend
+        output:
+            numpy.array (steps x (sweep.metrics + _metrics))
+        '''
+        import numpy
+        _n = _matrix.shape[0]
+        _source, _target, _weight, _counts = sweep.get_steps(_matrix, _thresholds, _densities)
+        _parent = numpy.arange(_n)
+        _components = _n
+        _degree = numpy.zeros(_n)
+        _strength = numpy.zeros(_n)
+        _current = numpy.zeros([_n, _n])
+        _results = numpy.zeros([len(_counts), len(sweep.metrics) + len(_metrics)])
+        _undefined = (ValueError,)
+        if _backend == 'networkx':
+            import networkx
+            _undefined += (networkx.NetworkXError,)
+        _added = 0
+        for step in numpy.argsort(_counts, kind = 'stable'):
+            _edges = slice(_added, _counts[step])
+            for a, b in zip(_source[_edges], _target[_edges]):
+                while _parent[a] != a:
+                    _parent[a] = _parent[_parent[a]]
+                    a = _parent[a]
+                while _parent[b] != b:
+                    _parent[b] = _parent[_parent[b]]
+                    b = _parent[b]
+                if a != b:
+                    _parent[a] = b
+                    _components -= 1
+            numpy.add.at(_degree, _source[_edges], 1)
+            numpy.add.at(_degree, _target[_edges], 1)
+            numpy.add.at(_strength, _source[_edges], _weight[_edges])
+            numpy.add.at(_strength, _target[_edges], _weight[_edges])
+            _current[_source[_edges], _target[_edges]] = _current[_target[_edges], _source[_edges]] = _weight[_edges]
+            _added = _counts[step]
+            _results[step, :len(sweep.metrics)] = [2 * _added / (_n * (_n - 1)), numpy.mean(_degree), numpy.mean(_strength), _components]
+            # intermediate graphs are not reused, skip surrogate disk cache
+            cc = network(_current, _backend = _backend, _nullcache = False)
+            for i, metric in enumerate(_metrics):
+                try:
+                    _results[step, len(sweep.metrics) + i] = getattr(Global, metric)(cc)
+                except _undefined:
+                    # metric undefined for current graph, e.g. disconnected
+                    _results[step, len(sweep.metrics) + i] = numpy.nan
+        return(_results)
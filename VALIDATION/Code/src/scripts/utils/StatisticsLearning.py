@@ -49,6 +49,205 @@ class stats:
         _cleanx1 = _x1[_x1 == _x1].copy()
         _cleanx2 = _x2[_x2 == _x2].copy()
         return(getattr(scipy.stats,_test)(_cleanx1, _cleanx2))
+    def get_indicator(_x1, _x2):
+        '''
+        return combined data matrix (subjects x features) with nan set to zero,
+        validity mask and group indicator of first group
+        '''
+        import numpy
+        _data = numpy.concatenate([numpy.atleast_2d(numpy.asarray(_x1, dtype = float).T).T,
+            numpy.atleast_2d(numpy.asarray(_x2, dtype = float).T).T], axis = 0)
+        _valid = _data == _data
+        _indicator = numpy.concatenate([numpy.ones(len(_x1)), numpy.zeros(len(_x2))])
+        return(numpy.where(_valid, _data, 0), _valid.astype(float), _indicator)
+    def get_tstat(_indicator, _data, _valid, _equal_var = False):
+        '''
+        compute two sample t statistics for all features and one or many group
+        assignments at once from group sums (matrix products)
+
+        ---
+        input:
+            _indicator group membership (subjects) or (assignments x subjects)
+            _data subjects x features, nan set to zero
+            _valid subjects x features validity mask
+            [optional] _equal_var student t-test, default = welch t-test
+        output:
+            t statistics, degrees of freedom (features) or (assignments x features)
+        '''
+        import numpy
+        _other = 1 - _indicator
+        _n1, _n2 = numpy.dot(_indicator, _valid), numpy.dot(_other, _valid)
+        _s1, _s2 = numpy.dot(_indicator, _data), numpy.dot(_other, _data)
+        _q1, _q2 = numpy.dot(_indicator, _data ** 2), numpy.dot(_other, _data ** 2)
+        with numpy.errstate(divide = 'ignore', invalid = 'ignore'):
+            _m1, _m2 = _s1 / _n1, _s2 / _n2
+            _v1, _v2 = (_q1 - _n1 * _m1 ** 2) / (_n1 - 1), (_q2 - _n2 * _m2 ** 2) / (_n2 - 1)
+            if _equal_var:
+                _df = _n1 + _n2 - 2
+                _se = numpy.sqrt(((_n1 - 1) * _v1 + (_n2 - 1) * _v2) / _df * (1 / _n1 + 1 / _n2))
+            else:
+                _df = (_v1 / _n1 + _v2 / _n2) ** 2 / ((_v1 / _n1) ** 2 / (_n1 - 1) + (_v2 / _n2) ** 2 / (_n2 - 1))
+                _se = numpy.sqrt(_v1 / _n1 + _v2 / _n2)
+            return((_m1 - _m2) / _se, _df)
+    def get_ranks(_data, _valid):
+        '''
+        rank features across subjects ignoring nan, return ranks and
+        tie correction term sum(t^3 - t) from tie group sizes (max - min + 1)
+        '''
+        import numpy, scipy.stats
+        _masked = numpy.where(_valid > 0, _data, numpy.inf)
+        _ranks = scipy.stats.rankdata(_masked, axis = 0)
+        _ties = scipy.stats.rankdata(_masked, method = 'max', axis = 0) - scipy.stats.rankdata(_masked, method = 'min', axis = 0) + 1
+        return(numpy.where(_valid > 0, _ranks, 0), numpy.sum(numpy.where(_valid > 0, _ties ** 2 - 1, 0), axis = 0))
+    def get_ustat(_indicator, _ranks, _valid, _ties):
+        '''
+        compute standardized mann-whitney U statistics (normal approximation
+        with tie and continuity correction) from rank sums
+
+        ---
+        input:
+            _indicator group membership (subjects) or (assignments x subjects)
+            _ranks, _ties ranks and tie correction, see stats.get_ranks
+            _valid subjects x features validity mask
+        output:
+            z statistics, U statistics of first group
+        '''
+        import numpy
+        _n1, _n2 = numpy.dot(_indicator, _valid), numpy.dot(1 - _indicator, _valid)
+        _n = _n1 + _n2
+        _u = numpy.dot(_indicator, _ranks) - _n1 * (_n1 + 1) / 2
+        with numpy.errstate(divide = 'ignore', invalid = 'ignore'):
+            _sigma = numpy.sqrt(_n1 * _n2 / 12 * ((_n + 1) - _ties / (_n * (_n - 1))))
+            _shift = _u - _n1 * _n2 / 2
+            return(numpy.sign(_shift) * numpy.maximum(abs(_shift) - .5, 0) / _sigma, _u)
+    def get_fdr(_pvalues):
+        '''
+        benjamini-hochberg false discovery rate adjusted p-values, nan ignored
+        '''
+        import numpy
+        _pvalues = numpy.asarray(_pvalues, dtype = float)
+        _adjusted = numpy.full(_pvalues.shape, numpy.nan)
+        _index = numpy.flatnonzero(_pvalues == _pvalues)
+        _order = _index[numpy.argsort(_pvalues[_index])]
+        _scaled = _pvalues[_order] * len(_order) / numpy.arange(1, len(_order) + 1)
+        _adjusted[_order] = numpy.minimum(numpy.minimum.accumulate(_scaled[::-1])[::-1], 1)
+        return(_adjusted)
+    def get_quantiles(_sorted, _quantiles):
+        '''
+        linear interpolated quantiles of column sorted draws (draws x features)
+        with one quantile per feature, undefined (nan) quantiles yield nan
+        '''
+        import numpy
+        _position = numpy.clip(_quantiles, 0, 1) * (_sorted.shape[0] - 1)
+        _defined = _position == _position
+        _lower = numpy.floor(numpy.where(_defined, _position, 0)).astype(int)
+        _upper = numpy.minimum(_lower + 1, _sorted.shape[0] - 1)
+        _low = numpy.take_along_axis(_sorted, _lower[None, :], axis = 0)[0]
+        _high = numpy.take_along_axis(_sorted, _upper[None, :], axis = 0)[0]
+        return(numpy.where(_defined, _low + (_position - _lower) * (_high - _low), numpy.nan))
+    def get_bootstrap(_data, _statistic = 'mean', _draws = 10000, _confidence = .95, _seed = 0, _batch = 1000):
+        '''
+        bootstrap percentile and bias corrected accelerated (BCa) confidence
+        intervals of cohort mean or median for all features at once.
+        Resamples are drawn as matrices (draws x subjects), means are computed
+        as products of resample count matrices with the data.
+
+        ---
+        input:
+            _data matrix (subjects x features), nan allowed
+            [optional] _statistic <mean> or <median>
+            [optional] _draws number of bootstrap resamples
+            [optional] _confidence level of intervals
+            [optional] _seed of resampling
+            [optional] _batch number of resamples per matrix operation
+        output:
+            dictionary of estimate (features), percentile and bca intervals (2 x features),
+            bca falls back to percentile interval where its quantiles are undefined
+        '''
+        import numpy, scipy.stats, warnings
+        _data = numpy.atleast_2d(numpy.asarray(_data, dtype = float).T).T
+        _n = _data.shape[0]
+        _valid = (_data == _data).astype(float)
+        _zeroed = numpy.where(_valid > 0, _data, 0)
+        _rng = numpy.random.default_rng(_seed)
+        with numpy.errstate(divide = 'ignore', invalid = 'ignore'), warnings.catch_warnings():
+            warnings.simplefilter('ignore', RuntimeWarning)
+            _median = numpy.median if numpy.all(_valid) else numpy.nanmedian
+            if _statistic == 'median':
+                _estimate = _median(_data, axis = 0)
+                _jackknife = numpy.array([_median(numpy.delete(_data, i, axis = 0), axis = 0) for i in range(_n)])
+            else:
+                _estimate = numpy.sum(_zeroed, axis = 0) / numpy.sum(_valid, axis = 0)
+                _jackknife = (numpy.sum(_zeroed, axis = 0) - _zeroed) / (numpy.sum(_valid, axis = 0) - _valid)
+            _boot = []
+            for start in range(0, _draws, _batch):
+                _size = min(_batch, _draws - start)
+                if _statistic == 'median':
+                    _boot.append(_median(_data[_rng.integers(0, _n, (_size, _n))], axis = 1))
+                else:
+                    _counts = _rng.multinomial(_n, numpy.full(_n, 1 / _n), size = _size).astype(float)
+                    _boot.append(numpy.dot(_counts, _zeroed) / numpy.dot(_counts, _valid))
+            _boot = numpy.sort(numpy.concatenate(_boot), axis = 0)
+            _tail = (1 - _confidence) / 2
+            _alpha = numpy.array([_tail, 1 - _tail])
+            _percentile = numpy.array([stats.get_quantiles(_boot, numpy.full(_data.shape[1], q)) for q in _alpha])
+            _bias = scipy.stats.norm.ppf(numpy.mean(_boot < _estimate, axis = 0))
+            _deviation = numpy.nanmean(_jackknife, axis = 0) - _jackknife
+            _acceleration = numpy.nansum(_deviation ** 3, axis = 0) / (6 * numpy.nansum(_deviation ** 2, axis = 0) ** 1.5)
+            _z = scipy.stats.norm.ppf(_alpha)[:, None]
+            _adjusted = scipy.stats.norm.cdf(_bias + (_bias + _z) / (1 - _acceleration * (_bias + _z)))
+            _bca = numpy.array([stats.get_quantiles(_boot, q) for q in _adjusted])
+        _degenerate = numpy.any(_adjusted != _adjusted, axis = 0) & numpy.all(_percentile == _percentile, axis = 0)
+        if numpy.any(_degenerate):
+            from utils.Utility import helper
+            helper.log_msg("UPDATE:    BCa interval undefined for "+str(numpy.sum(_degenerate))+" features, using percentile interval")
+            _bca[:, _degenerate] = _percentile[:, _degenerate]
+        return({'estimate': _estimate, 'percentile': _percentile, 'bca': _bca})
+    def get_groupstats(_x1, _x2, _test = 'ttest', _correction = 'fdr', _permutations = 1000, _seed = 0, _batch = 100, _equal_var = False):
+        '''
+        mass univariate group comparison of all features at once
+
+        ---
+        input:
+            _x1, _x2 group data matrices (subjects x features), nan allowed
+            [optional] _test <ttest> (welch) or <utest> (mann-whitney U)
+            [optional] _correction <fdr>, <maxt> permutation max statistic or None
+            [optional] _permutations number of label permutations for <maxt>
+            [optional] _seed of permutations
+            [optional] _batch number of permutations evaluated per matrix product
+            [optional] _equal_var student instead of welch t-test
+        output:
+            dictionary of statistic (t, or z of normal approximation for utest),
+            pvalue and corrected pvalue per feature, for utest additionally
+            U statistics of first group
+        '''
+        import numpy, scipy.stats
+        _data, _valid, _indicator = stats.get_indicator(_x1, _x2)
+        _data = numpy.where(_valid > 0, _data - numpy.sum(_data, axis = 0) / numpy.maximum(numpy.sum(_valid, axis = 0), 1), 0)
+        if _test == 'utest':
+            _ranks, _ties = stats.get_ranks(_data, _valid)
+            _statistic = lambda i: stats.get_ustat(i, _ranks, _valid, _ties)[0]
+            _observed, _u = stats.get_ustat(_indicator, _ranks, _valid, _ties)
+            _pvalues = 2 * scipy.stats.norm.sf(abs(_observed))
+        else:
+            _statistic = lambda i: stats.get_tstat(i, _data, _valid, _equal_var)[0]
+            _observed, _df = stats.get_tstat(_indicator, _data, _valid, _equal_var)
+            _pvalues = 2 * scipy.stats.t.sf(abs(_observed), _df)
+        _output = {'statistic': _observed, 'pvalue': numpy.minimum(_pvalues, 1)}
+        if _test == 'utest':
+            _output['U'] = _u
+        if _correction == 'fdr':
+            _output['corrected'] = stats.get_fdr(_output['pvalue'])
+        elif _correction == 'maxt':
+            _rng = numpy.random.default_rng(_seed)
+            _maximum = []
+            for start in range(0, _permutations, _batch):
+                _shuffled = numpy.array([_rng.permutation(_indicator) for _ in range(min(_batch, _permutations - start))])
+                _maximum.append(numpy.nanmax(abs(_statistic(_shuffled)), axis = 1))
+            _maximum = numpy.concatenate(_maximum)
+            _output['corrected'] = (numpy.sum(_maximum[:, None] >= abs(_observed)[None, :], axis = 0) + 1) / (_permutations + 1)
+            _output['corrected'] = numpy.where(_observed == _observed, _output['corrected'], numpy.nan)
+        return(_output)
 
 
 class learning:
@@ -90,9 +289,12 @@ class learning:
         return(numpy.concatenate([_dict[keys[0]],_dict[keys[1]]], axis = 0 ))
     def get_split(_split = .1, _runs = 100):
         '''
-        get cross validation subset generator object for indexing
+        get cross validation subset generator object for indexing,
+        _split = 'loocv' returns leave one out splits
         '''
         import sklearn.model_selection
+        if _split == 'loocv':
+            return(sklearn.model_selection.LeaveOneOut())
         return(sklearn.model_selection.StratifiedShuffleSplit(n_splits=_runs,test_size=_split))
     def get_performance(_predictions):
         '''
@@ -130,7 +332,7 @@ class algorithms:
         '''
         intialization of learning algorithm class
         '''
-    def run_randomforest(_data,_labels, _train_idx, _test_idx, _metric = 'gini'):
+    def run_randomforest(_data,_labels, _train_idx, _test_idx, _metric = 'gini', _jobs = None):
         '''
         performing classification for given data and labels using random forest
 
@@ -138,6 +340,7 @@ class algorithms:
         input:
             training data and corresponding training labels, test data to predict
             [optional] = feature importance metric, default = "gini index"
+            [optional] = _jobs number of threads for tree construction
         output:
             prediction for provided test set & feature importance
         '''
@@ -148,13 +351,13 @@ class algorithms:
             max_features ='sqrt',
             criterion = _metric,
             class_weight='balanced_subsample',
-            n_jobs = None)
+            n_jobs = _jobs)
         model.fit(_data[_train_idx,:],_labels[_train_idx])
         output['prediction'] = model.predict(_data[_test_idx,:])
         output['importance'] = model.feature_importances_
         output['labels'] = _labels[_test_idx]
         return(output)
-    def run_svm(_data,_labels, _train_idx, _test_idx, _cost = .1, _kernel = 'linear'):
+    def run_svm(_data,_labels, _train_idx, _test_idx, _cost = .1, _kernel = 'linear', _jobs = None):
         '''
         performing classification for given data and labels using support vector machines
         
@@ -162,6 +365,7 @@ class algorithms:
         input:
             training data and corresponding training labels, test data to predict
             [optional]: C _costm , kernel function _kernel
+            [optional]: _jobs unused, libsvm is single threaded
         output:
             prediction for provided test set & model coefficients
         '''
@@ -178,41 +382,312 @@ class algorithms:
         output['importance'] = model.coef_
         output['labels'] = _labels[_test_idx]
         return(output)
+    def run_ridge(_data,_labels, _train_idx, _test_idx, _alpha = 1.0, _jobs = None):
+        '''
+        performing classification for given data and labels using ridge classifier
 
+        ---
+        input:
+            training data and corresponding training labels, test data to predict
+            [optional]: regularization strength _alpha
+            [optional]: _jobs unused
+        output:
+            prediction for provided test set & model coefficients
+        '''
+        import sklearn.linear_model
+        output = dict()
+        model = sklearn.linear_model.RidgeClassifier(alpha = _alpha)
+        model.fit(_data[_train_idx,:],_labels[_train_idx])
+        output['prediction'] = model.predict(_data[_test_idx,:])
+        output['importance'] = model.coef_.ravel()
+        output['labels'] = _labels[_test_idx]
+        return(output)
+    def run_lda(_data,_labels, _train_idx, _test_idx, _jobs = None):
+        '''
+        performing classification for given data and labels using linear discriminant analysis
 
+        ---
+        input:
+            training data and corresponding training labels, test data to predict
+            [optional]: _jobs unused
+        output:
+            prediction for provided test set & model coefficients
+        '''
+        import sklearn.discriminant_analysis
+        output = dict()
+        model = sklearn.discriminant_analysis.LinearDiscriminantAnalysis()
+        model.fit(_data[_train_idx,:],_labels[_train_idx])
+        output['prediction'] = model.predict(_data[_test_idx,:])
+        output['importance'] = model.coef_.ravel()
+        output['labels'] = _labels[_test_idx]
+        return(output)
+    def run_ridge_loocv(_data, _labels, _alpha = 1.0, _jobs = None):
+        '''
+        exact leave one out cross validation of ridge classifier from a single
+        kernel inversion. Each held out fit is obtained by downdating the inverse
+        of G = XX^T + alpha I (Sherman-Morrison), the intercept is unpenalized
+        as in sklearn.linear_model.RidgeClassifier.
 
+        ---
+        input:
+            full data set, full label list
+            [optional]: regularization strength _alpha
+            [optional]: _jobs unused
+        output:
+            list of prediction & model coefficients for each left out subject
+        '''
+        import numpy
+        _data = numpy.asarray(_data, dtype = float)
+        _classes = numpy.unique(_labels)
+        _targets = numpy.where(_labels[:, None] == _classes[None, :], 1., -1.)
+        if len(_classes) == 2:
+            _targets = _targets[:, 1:]
+        _n = len(_labels)
+        _gram = numpy.dot(_data, _data.T)
+        _inverse = numpy.linalg.inv(_gram + _alpha * numpy.eye(_n))
+        _outputs = []
+        for i in range(_n):
+            _keep = numpy.arange(_n) != i
+            _column = _inverse[_keep, i]
+            _reduced = _inverse[numpy.ix_(_keep, _keep)] - numpy.outer(_column, _column) / _inverse[i, i]
+            _ones = numpy.sum(_reduced, axis = 1)
+            _intercept = numpy.dot(_ones, _targets[_keep]) / numpy.sum(_ones)
+            _dual = numpy.dot(_reduced, _targets[_keep] - _intercept)
+            _score = numpy.dot(_gram[i, _keep], _dual) + _intercept
+            output = dict()
+            output['prediction'] = _classes[[int(_score[0] > 0)]] if len(_classes) == 2 else _classes[[numpy.argmax(_score)]]
+            output['importance'] = numpy.dot(_data[_keep].T, _dual).T.ravel()
+            output['labels'] = _labels[[i]]
+            _outputs.append(output)
+        return(_outputs)
+    def get_gram(_data):
+        '''
+        compute subjects x subjects linear kernel matrix once for all folds
 
+        ---
+        input:
+            feature matrix (subjects x features)
+        output:
+            numpy.array kernel matrix (subjects x subjects)
+        '''
+        import numpy
+        _data = numpy.asarray(_data, dtype = float)
+        return(numpy.dot(_data, _data.T))
+    def get_kernel(_gram, _rows, _cols, _kernel = 'linear', _gamma = 1):
+        '''
+        return kernel block between subjects _rows and _cols from the
+        linear kernel matrix, rbf kernel via squared euclidean distances
+        '''
+        import numpy
+        _block = _gram[numpy.ix_(_rows, _cols)]
+        if _kernel == 'linear':
+            return(_block)
+        _norm = numpy.diag(_gram)
+        return(numpy.exp(-_gamma * numpy.maximum(_norm[_rows][:, None] + _norm[_cols][None, :] - 2 * _block, 0)))
+    def run_svm_gram(_data, _labels, _train_idx, _test_idx, _gram, _costs = [.1], _kernel = 'linear', _gamma = 'scale', _importance = True, _jobs = None):
+        '''
+        performing classification using support vector machines on a precomputed
+        kernel matrix, shared across folds and a grid of C values
 
-# def run_loocv(data,labels, algo = 'SVM',verbose = False):
-#     '''
-#      performing leave one out cross validation for all subjects
+        ---
+        input:
+            training data and corresponding training labels, test data to predict
+            _gram linear kernel matrix of all subjects, see algorithms.get_gram
+            [optional]: list of C values _costs
+            [optional]: kernel function _kernel <linear> or <rbf>
+            [optional]: _gamma of rbf kernel, default = "scale" 1 / (features * var(X))
+                        computed on the training subjects of each fold (as sklearn.svm.SVC)
+            [optional]: _importance recover primal weights of linear kernel as importance
+            [optional]: _jobs unused, libsvm is single threaded
+        output:
+            list of prediction for provided test set & model coefficients per C value
+        '''
+        import sklearn.svm, numpy
+        if _gamma == 'scale':
+            _var = _data[_train_idx].var()
+            _gamma = 1 / (_data.shape[1] * _var) if _var > 0 else 1
+        _train = algorithms.get_kernel(_gram, _train_idx, _train_idx, _kernel, _gamma)
+        _test = algorithms.get_kernel(_gram, _test_idx, _train_idx, _kernel, _gamma)
+        _outputs = []
+        for _cost in _costs:
+            output = dict()
+            model = sklearn.svm.SVC(
+                C = _cost,
+                kernel = 'precomputed',
+                class_weight = 'balanced'
+                )
+            model.fit(_train, _labels[_train_idx])
+            output['prediction'] = model.predict(_test)
+            if _importance and _kernel == 'linear':
+                output['importance'] = numpy.dot(model.dual_coef_, _data[_train_idx[model.support_],:]).ravel()
+            else:
+                output['importance'] = numpy.full(_data.shape[1], numpy.nan)
+            output['labels'] = _labels[_test_idx]
+            _outputs.append(output)
+        return(_outputs)
 
-#      input: full data set, full label list
-#      output: prediction for each subject, array of feature importances within each cross validation run
-#     '''
-#     subjects = data.index
-#     prediction = labels.copy()
-#     importances = pandas.DataFrame(numpy.zeros(data.shape), index = subjects)
-#     if verbose:
-#         print('START: running LOOCV classification')
-#         bar = init_statusbar(len(subjects))
-#         i = 0
-#         bar.start()
-#     for s in subjects:
-#         x_train = data.drop(s, axis = 0).values
-#         y_train = labels.drop(s, axis = 0).values.ravel()
-#         x_test = data.loc[s,:].values.reshape(1,-1)
-#         if algo == 'RF':
-#             prediction.loc[s], importances.loc[s,:]= run_randomforest(x_train,y_train,x_test)
-#         if algo == 'SVM':
-#             prediction.loc[s], importances.loc[s,:]= run_svm(x_train,y_train,x_test)
-#         if verbose:
-#             bar.update(i+1)
-#             i+=1
-#     if verbose:
-#         print('\n FNISHED: running LOOCV random forest classification')
-#     performance = sklearn.metrics.f1_score(labels,prediction)
-#     return(performance, importances)
+
+
+
+class crossvalidation:
+    '''
+    parallel cross validation executor, the feature matrix is written
+    once to a shared memory backed file and folds are distributed
+    across processes
+    '''
+    def __init__(self):
+        '''
+        intialization of cross validation executor class
+        '''
+    def get_budget(_workers, _folds):
+        '''
+        split core budget between fold level processes and
+        model level threads
+
+        ---
+        input:
+            _workers total number of cores to use, default = all available
+            _folds number of cross validation folds
+        output:
+            number of fold processes, number of threads per model
+        '''
+        from utils.Utility import scheduler
+        _workers = scheduler.get_workers(_workers)
+        _processes = max(1, min(_workers, _folds))
+        return(_processes, max(1, _workers // _processes))
+    def get_shared(_data):
+        '''
+        write feature matrix to memory mapped file in /dev/shm
+        (temporary directory if not available)
+        '''
+        import os, tempfile, numpy
+        _directory = '/dev/shm' if os.access('/dev/shm', os.W_OK) else None
+        _handle, _file = tempfile.mkstemp(suffix = '.npy', prefix = 'features-', dir = _directory)
+        with os.fdopen(_handle, 'wb') as f:
+            numpy.save(f, numpy.ascontiguousarray(_data))
+        return(_file)
+    def run_fold(_file, _labels, _function, _options, _train_idx, _test_idx):
+        '''
+        run classification of a single fold on memory mapped features
+        '''
+        import numpy
+        _data = numpy.load(_file, mmap_mode = 'r')
+        return(_function(_data, _labels, _train_idx, _test_idx, **_options))
+    def run(_function, _data, _labels, _splits, _workers = None, _options = dict()):
+        '''
+        run cross validation folds in parallel
+
+        ---
+        input:
+            _function classification algorithm, e.g. algorithms.run_randomforest
+            _data feature matrix (subjects x features)
+            _labels class labels
+            _splits iterable of (train, test) index arrays
+            [optional] _workers total number of cores, default = all available
+            [optional] _options additional keyword arguments for _function
+        output:
+            list of fold outputs in order of _splits
+        '''
+        import os
+        from utils.Utility import scheduler
+        _splits = list(_splits)
+        _processes, _jobs = crossvalidation.get_budget(_workers, len(_splits))
+        _options = dict(_options, _jobs = _jobs)
+        _file = crossvalidation.get_shared(_data)
+        try:
+            return(scheduler.run(crossvalidation.run_fold, _splits, _workers = _processes, _shared = (_file, _labels, _function, _options)))
+        finally:
+            os.remove(_file)
+
+
+
+class permutation:
+    '''
+    label permutation test of cross validated classification accuracy
+    with sequential stopping, permutations run in parallel from
+    independent random streams on shared features
+    '''
+    def __init__(self):
+        '''
+        intialization of permutation test class
+        '''
+    def get_accuracy(_outputs):
+        '''
+        return mean accuracy across folds, one value per model if
+        fold outputs are lists (e.g. grid of C values)
+        '''
+        import numpy
+        if isinstance(_outputs[0], dict):
+            return(numpy.array([numpy.mean(learning.get_performance(_outputs))]))
+        return(numpy.array([numpy.mean(learning.get_performance([o[i] for o in _outputs])) for i in range(len(_outputs[0]))]))
+    def run_job(_file, _labels, _function, _options, _splits, _seed):
+        '''
+        run cross validation with labels shuffled by random stream _seed
+        '''
+        import numpy
+        _data = numpy.load(_file, mmap_mode = 'r')
+        _shuffled = numpy.random.default_rng(_seed).permutation(_labels)
+        if _splits is None:
+            return(permutation.get_accuracy(_function(_data, _shuffled, **_options)))
+        return(permutation.get_accuracy([_function(_data, _shuffled, _train, _test, **_options) for _train, _test in _splits]))
+    def get_bounds(_exceed, _count, _confidence = .99):
+        '''
+        clopper-pearson confidence interval of monte carlo p-value
+        '''
+        import numpy, scipy.stats
+        _tail = (1 - _confidence) / 2
+        _lower = numpy.where(_exceed > 0, scipy.stats.beta.ppf(_tail, numpy.maximum(_exceed, 1), _count - _exceed + 1), 0)
+        _upper = numpy.where(_exceed < _count, scipy.stats.beta.ppf(1 - _tail, _exceed + 1, numpy.maximum(_count - _exceed, 1)), 1)
+        return(_lower, _upper)
+    def run(_function, _data, _labels, _observed, _splits = None, _workers = None, _options = dict(),
+            _permutations = 1000, _alpha = .05, _confidence = .99, _seed = 0):
+        '''
+        sequential monte carlo permutation test, batches of permutations are
+        evaluated until the confidence interval of the p-value excludes
+        _alpha or the maximum number of permutations is reached
+
+        ---
+        input:
+            _function classification algorithm, e.g. algorithms.run_svm_gram
+            _data feature matrix (subjects x features)
+            _labels class labels
+            _observed mean cross validated accuracy (per model)
+            [optional] _splits list of (train, test) index arrays, None if
+                       _function runs the full cross validation (run_ridge_loocv)
+            [optional] _workers total number of cores, default = all available
+            [optional] _options additional keyword arguments for _function
+            [optional] _permutations maximum number of permutations, at least 1
+            [optional] _alpha significance level
+            [optional] _confidence level of stopping interval
+            [optional] _seed of random streams
+        output:
+            dictionary of p-value, null distribution and number of permutations
+        '''
+        import os, numpy
+        from utils.Utility import scheduler, helper
+        if _permutations < 1:
+            raise ValueError('number of permutations must be at least 1.')
+        _observed = numpy.atleast_1d(_observed)
+        _splits = None if _splits is None else list(_splits)
+        _streams = numpy.random.SeedSequence(_seed).spawn(_permutations)
+        _processes, _jobs = crossvalidation.get_budget(_workers, _permutations)
+        _options = dict(_options, _jobs = _jobs)
+        _batch = max(_processes * 4, 20)
+        _file = crossvalidation.get_shared(_data)
+        _null = []
+        try:
+            while len(_null) < _permutations:
+                _null.extend(scheduler.run(permutation.run_job, [(seed,) for seed in _streams[len(_null):len(_null) + _batch]],
+                    _workers = _processes, _shared = (_file, _labels, _function, _options, _splits)))
+                _exceed = numpy.sum(numpy.array(_null) >= _observed - 1e-12, axis = 0)
+                _lower, _upper = permutation.get_bounds(_exceed, len(_null), _confidence)
+                if numpy.all((_upper < _alpha) | (_lower > _alpha)):
+                    helper.log_msg("UPDATE:    permutation test decided after "+str(len(_null))+" permutations")
+                    break
+        finally:
+            os.remove(_file)
+        _null = numpy.array(_null)
+        return({'pvalue': (_exceed + 1) / (len(_null) + 1), 'null': _null, 'permutations': len(_null)})
 
 
 
@@ -72,6 +72,8 @@ class io:
     '''
     input/output helper class
     '''
+    cachedir = None
+    cachemode = 'use'
     def __init__(self, _path, _string):
         '''
         initializing class object
@@ -80,18 +82,72 @@ class io:
         # self.helper = helper()
         # self.LUT = self.get_lookup(os.path.join(os.getcwd(),'LesionLoads','HCPMMP1_LUT_mrtrix.txt'))
         # # self.check_input()
+    def set_cache(_cachedir = None, _mode = 'use'):
+        '''
+        configure binary cache for text tables
+
+        ---
+        input:
+            _cachedir shared cache directory, default = .npycache directory next to input files
+            _mode <use> cached binaries, <rebuild> cache from text files or <off> bypass cache
+        '''
+        io.cachedir = _cachedir
+        io.cachemode = _mode
+    def get_cached(_filename, _parser, _key = ''):
+        '''
+        load text file through binary .npy cache keyed by path, size and modification time.
+        text file is parsed once, later loads are memory-mapped read only.
+        falls back to parsing if cache directory is not writable.
+
+        ---
+        input:
+            _filename of text table
+            _parser function returning numpy array for _filename
+            _key identifying parser options
+        output:
+            numpy array (read only numpy.memmap if cached)
+        '''
+        import os, glob, hashlib, numpy
+        if io.cachemode == 'off':
+            return(_parser(_filename))
+        _filename = os.path.abspath(_filename)
+        _stat = os.stat(_filename)
+        _hash = hashlib.sha1('|'.join([_filename, str(_stat.st_size), str(_stat.st_mtime_ns), _key]).encode()).hexdigest()
+        _dir = io.cachedir if io.cachedir else os.path.join(os.path.dirname(_filename), '.npycache')
+        _prefix = os.path.join(_dir, os.path.basename(_filename) + '.' + hashlib.sha1(_filename.encode()).hexdigest()[:8])
+        _cache = _prefix + '.' + _hash[:16] + '.npy'
+        if io.cachemode != 'rebuild' and os.path.isfile(_cache):
+            return(numpy.load(_cache, mmap_mode = 'r'))
+        _data = _parser(_filename)
+        try:
+            os.makedirs(_dir, exist_ok = True)
+            for _stale in glob.glob(glob.escape(_prefix) + '.*.npy'):
+                os.remove(_stale)
+            _temp = _cache + '.' + str(os.getpid()) + '.tmp'
+            with open(_temp, 'wb') as f:
+                numpy.save(f, _data)
+            os.replace(_temp, _cache)
+        except OSError:
+            pass
+        return(_data)
     def load_table(_path):
         '''
         load space seperated .txt file into numpy array
         '''
         import numpy
-        return(numpy.genfromtxt(_path, delimiter= ",", skip_header=1))
+        return(io.get_cached(_path, lambda f: numpy.genfromtxt(f, delimiter= ",", skip_header=1), 'table'))
+    def load_list(_path):
+        '''
+        load text file of strings (e.g. subject filenames), one per line after header
+        '''
+        import numpy
+        return([ str(s).strip() for s in numpy.atleast_1d(numpy.genfromtxt(_path, delimiter = ",", skip_header = 1, dtype = str)) ])
     def get_connectome(_filename):
         '''
         loading connectome file as created by MRtrix pipeline.
         '''
         import numpy
-        return(numpy.genfromtxt(_filename, delimiter= " "))
+        return(io.get_cached(_filename, lambda f: numpy.genfromtxt(f, delimiter= " "), 'connectome'))
     def get_nii(_filename):
         '''
         loading nifti image (.nii, .nii.gz)
@@ -99,6 +155,71 @@ class io:
         '''
         import nibabel
         return(nibabel.load(_filename))
+    def get_raw(_filename):
+        '''
+        loading nifti image data in its on-disk data type
+        without floating point intermediate copies.
+        scaled images (scl_slope/scl_inter) are returned scaled
+        '''
+        import numpy, nibabel
+        _dataobj = nibabel.load(_filename).dataobj
+        if nibabel.is_proxy(_dataobj) and getattr(_dataobj, 'slope', 1.0) == 1.0 and getattr(_dataobj, 'inter', 0.0) == 0.0:
+            return(numpy.asarray(_dataobj.get_unscaled()))
+        return(numpy.asarray(_dataobj))
+    def get_spacing(_filename):
+        '''
+        loading voxel sizes in mm from image affine without reading image data
+        '''
+        import numpy, nibabel
+        _affine = nibabel.load(_filename).affine
+        return(numpy.sqrt(numpy.sum(_affine[:3,:3]**2, axis = 0)))
+    def get_mask(_filename):
+        '''
+        loading binary mask image (.nii, .nii.gz)
+        output: boolean numpy array
+        '''
+        return(io.get_raw(_filename) != 0)
+    def get_labels(_filename):
+        '''
+        loading label image (e.g. parcellation) (.nii, .nii.gz)
+        output: uint16 numpy array if all labels fit, int32 otherwise
+        '''
+        import numpy
+        _data = io.get_raw(_filename)
+        if _data.dtype.kind == 'f':
+            _data = numpy.rint(_data)
+        if _data.size == 0 or (_data.min() >= 0 and _data.max() <= numpy.iinfo(numpy.uint16).max):
+            return(_data.astype(numpy.uint16, copy = False))
+        return(_data.astype(numpy.int32, copy = False))
+    def iter_subjects(_path, _labels, _subjectlist, _loader, _prefetch = True):
+        '''
+        lazily load data of all groups one subject at a time, keeping
+        at most the current and the prefetched next subject in memory
+
+        ---
+        input:
+            _path to group directories
+            _labels to select groups
+            _subjectlist of filenames present in all groups
+            _loader function returning data for a given filename (e.g. io.get_connectome)
+            [optional] _prefetch load next subject in background thread, default = True
+        output:
+            generator yielding subject ID and dictionary containing group data
+        '''
+        import os, concurrent.futures
+        def _load(_subject):
+            return(dict([ (l, _loader(os.path.join(_path, l, _subject))) for l in _labels ]))
+        if not _prefetch:
+            for s in _subjectlist:
+                yield(s, _load(s))
+            return
+        with concurrent.futures.ThreadPoolExecutor(max_workers = 1) as executor:
+            _next = executor.submit(_load, _subjectlist[0]) if len(_subjectlist) > 0 else None
+            for i, s in enumerate(_subjectlist):
+                _data = _next.result()
+                _next = executor.submit(_load, _subjectlist[i+1]) if i+1 < len(_subjectlist) else None
+                yield(s, _data)
+                _data = None
     # def get_dict(self, _path, _string):
     #     '''
     #     create dictionary containing tables in _path
@@ -164,6 +285,247 @@ class io:
 
 
 
+class dataset:
+    '''
+    persistent dataset manifest of per subject input files containing
+    subject ID, group label, file path, size, modification time and
+    content hash, updated incrementally on each scan
+
+    ---
+    Input:
+        _path to group directories
+        [optional] _directory of manifest file, default = _path
+    '''
+    def __init__(self, _path, _directory = None):
+        '''
+        load existing manifest
+        '''
+        import os, json
+        self.path = _path
+        self.filename = os.path.join(_directory if _directory else _path, 'DatasetManifest.json')
+        self.files = dict()
+        if os.path.isfile(self.filename):
+            with open(self.filename) as f:
+                self.files = json.load(f)
+    def get_hash(_filename, _blocksize = 2**20):
+        '''
+        return sha1 content hash of file read in blocks
+        '''
+        import hashlib
+        _hash = hashlib.sha1()
+        with open(_filename, 'rb') as f:
+            for _block in iter(lambda: f.read(_blocksize), b''):
+                _hash.update(_block)
+        return(_hash.hexdigest())
+    def get_key(self, _label, _subject):
+        '''
+        return manifest key (absolute file path) of subject file in group directory
+        '''
+        import os
+        return(os.path.abspath(os.path.join(self.path, str(_label), str(_subject))))
+    def scan(self, _labels, _pattern, _subjectlist = None):
+        '''
+        update manifest for group files matching _pattern, hashing only
+        new files or files with changed size or modification time,
+        entries of files no longer present are removed
+
+        ---
+        input:
+            _labels to select groups
+            _pattern of filenames in group directories (e.g. '*FC.txt')
+            [optional] _subjectlist of filenames to use instead of _pattern
+        output:
+            sorted subjectlist of elements in all groups or _subjectlist.
+            Error if not same elements
+        '''
+        import os, sys, glob, json
+        _list = dict()
+        _changed = []
+        for l in _labels:
+            if _subjectlist is None:
+                _list[l] = sorted([ os.path.basename(item) for item in glob.glob(os.path.join(self.path, str(l), _pattern)) ])
+            else:
+                _list[l] = [ str(s) for s in _subjectlist if os.path.isfile(os.path.join(self.path, str(l), str(s))) ]
+            for s in _list[l]:
+                _file = self.get_key(l, s)
+                _stat = os.stat(_file)
+                _entry = self.files.get(_file)
+                if _entry is None or _entry['size'] != _stat.st_size or _entry['mtime'] != _stat.st_mtime_ns:
+                    _hash = dataset.get_hash(_file)
+                    if _entry is None or _entry['hash'] != _hash:
+                        _changed.append(_file)
+                    self.files[_file] = {'subject': s, 'label': str(l), 'file': _file,
+                        'size': _stat.st_size, 'mtime': _stat.st_mtime_ns, 'hash': _hash}
+        self.files = dict([ (k, v) for k, v in self.files.items() if os.path.isabs(k) and os.path.isfile(k) ])
+        if _subjectlist is not None and any([ len(_list[l]) != len(_subjectlist) for l in _labels ]):
+            mismatch = [ str(l)+'/'+str(s) for l in _labels for s in _subjectlist if str(s) not in _list[l] ]
+            helper.log_msg("ERROR:    files of subjectlist not found. Please check before continuing.")
+            helper.log_msg('ERROR:    missing files: '+str(mismatch))
+            sys.exit()
+        if not bool(_list[_labels[0]]):
+            helper.log_msg("ERROR:    No files found. Please check naming.")
+        for l in _labels[1:]:
+            if _list[_labels[0]] != _list[l]:
+                mismatch = list(set(_list[_labels[0]]) ^ set(_list[l]))
+                helper.log_msg("ERROR:    unequal subjects in both groups. Please check before continuing.")
+                helper.log_msg('ERROR:    files not present in both lists: '+str(mismatch))
+                sys.exit()
+        if _changed:
+            helper.log_msg("UPDATE:    dataset manifest found "+str(len(_changed))+" new or changed files")
+        try:
+            with open(self.filename + '.' + str(os.getpid()) + '.tmp', 'w') as f:
+                json.dump(self.files, f, indent = 1)
+            os.replace(self.filename + '.' + str(os.getpid()) + '.tmp', self.filename)
+        except OSError:
+            helper.log_msg("UPDATE:    dataset manifest "+str(self.filename)+" not writable")
+        return(_list[_labels[0]])
+    def get_keys(self, _labels, _subjectlist):
+        '''
+        return per subject keys combining subject ID and content hashes of
+        all groups, e.g. as checkpoint keys so that only subjects with new
+        or changed input files are recomputed
+        '''
+        import hashlib
+        return([ str(s)+'.'+hashlib.sha1(''.join([ self.files[self.get_key(l, s)]['hash'] for l in _labels ]).encode()).hexdigest()[:16] for s in _subjectlist ])
+
+
+class store:
+    '''
+    cohort level connectome stack store containing one contiguous
+    float32 array (subjects x N x N) or upper triangles (subjects x N(N-1)/2)
+    per group label, opened via memory-mapping
+
+    ---
+    Input:
+        directory of store created with store.build
+    '''
+    def __init__(self, _directory):
+        '''
+        open existing store
+        '''
+        import os, json, numpy
+        self._directory = _directory
+        with open(os.path.join(_directory, 'meta.json')) as f:
+            self.meta = json.load(f)
+        self.subjects = list(self.meta['subjects'])
+        self._index = dict([ (s, i) for i, s in enumerate(self.subjects) ])
+        self.data = numpy.load(os.path.join(_directory, 'data.npy'), mmap_mode = 'r')
+    def exists(_directory):
+        '''
+        check if store exists in _directory
+        '''
+        import os
+        return(os.path.isfile(os.path.join(_directory, 'meta.json')) and os.path.isfile(os.path.join(_directory, 'data.npy')))
+    def build(_directory, _path, _label, _subjectlist, _triangle = False, _loader = None):
+        '''
+        create or incrementally update store from per subject text files.
+        only new subjects or subjects with changed source files (absolute path, size,
+        modification time) are parsed.
+
+        ---
+        input:
+            _directory of store
+            _path to group directories
+            _label of group
+            _subjectlist of filenames in group directory
+            [optional] _triangle store upper triangles only, default = False
+            [optional] _loader function returning matrix for a given filename, default = io.get_connectome
+        output:
+            store object
+        '''
+        import os, json, numpy
+        if _loader is None:
+            _loader = io.get_connectome
+        _old = store(_directory) if store.exists(_directory) else None
+        if _old is not None and _old.meta['triangle'] != _triangle:
+            _old = None
+        _sources = dict()
+        for s in _subjectlist:
+            _file = os.path.abspath(os.path.join(_path, _label, s))
+            _stat = os.stat(_file)
+            _sources[s] = [_file, _stat.st_size, _stat.st_mtime_ns]
+        _subjects = list(_old.subjects) if _old is not None else []
+        _subjects += [ s for s in _subjectlist if s not in _subjects ]
+        _update = [ s for s in _subjectlist if _old is None or _old.meta['sources'].get(s) != _sources[s] ]
+        if not _update:
+            return(_old)
+        _meta = dict()
+        _meta['sources'] = dict(_old.meta['sources']) if _old is not None else dict()
+        _meta['sources'].update(_sources)
+        os.makedirs(_directory, exist_ok = True)
+        _temp = os.path.join(_directory, 'data.npy.' + str(os.getpid()) + '.tmp')
+        _data = None
+        _rows = dict([ (s, _subjects.index(s)) for s in _update ])
+        for s, _matrix in io.iter_subjects(_path, [_label], _update, _loader):
+            _matrix = _matrix[_label]
+            if _data is None:
+                _size = _old.meta['size'] if _old is not None else _matrix.shape[0]
+                _shape = (len(_subjects), _size*(_size-1)//2) if _triangle else (len(_subjects), _size, _size)
+                _data = numpy.lib.format.open_memmap(_temp, mode = 'w+', dtype = numpy.float32, shape = _shape)
+                if _old is not None:
+                    _data[:len(_old.subjects)] = _old.data
+            if _matrix.shape != (_size, _size):
+                raise ValueError('connectome '+str(s)+' of shape '+str(_matrix.shape)+' does not match store size '+str(_size))
+            _data[_rows[s]] = store.pack(_matrix, _triangle)
+        _data.flush()
+        del _data
+        _meta['subjects'] = _subjects
+        _meta['label'] = _label
+        _meta['size'] = _size
+        _meta['triangle'] = _triangle
+        _meta['dtype'] = 'float32'
+        os.replace(_temp, os.path.join(_directory, 'data.npy'))
+        with open(os.path.join(_directory, 'meta.json.tmp'), 'w') as f:
+            json.dump(_meta, f)
+        os.replace(os.path.join(_directory, 'meta.json.tmp'), os.path.join(_directory, 'meta.json'))
+        return(store(_directory))
+    def pack(_matrix, _triangle = False):
+        '''
+        convert matrix into stored representation
+        '''
+        import numpy
+        if _triangle:
+            return(_matrix[transform.get_triu(_matrix.shape[0], 1)])
+        return(_matrix)
+    def index(self, _subject):
+        '''
+        return row index of subject in store
+        '''
+        return(self._index[_subject])
+    def get(self, _subject, _dtype = float):
+        '''
+        return full matrix of subject as array of _dtype,
+        upper triangle stores are mirrored with zero diagonal
+        '''
+        import numpy
+        _row = numpy.array(self.data[self.index(_subject)], dtype = _dtype)
+        if not self.meta['triangle']:
+            return(_row)
+        _matrix = numpy.zeros([self.meta['size'], self.meta['size']], dtype = _dtype)
+        _matrix[transform.get_triu(self.meta['size'], 1)] = _row
+        return(_matrix + _matrix.T)
+    def get_stack(self, _subjects = None):
+        '''
+        return stored array for given subjects (default: all) in given order
+        '''
+        if _subjects is None:
+            return(self.data)
+        return(self.data[[ self.index(s) for s in _subjects ]])
+    def get_vectors(self, _subjects = None, _offset = 1):
+        '''
+        return subjects x edges array of upper triangle entries
+        with diagonal offset _offset (1 = without diagonal)
+        '''
+        _stack = self.get_stack(_subjects)
+        if self.meta['triangle']:
+            if _offset != 1:
+                raise ValueError('upper triangle store only contains entries above the diagonal')
+            return(_stack)
+        _rows, _cols = transform.get_triu(self.meta['size'], _offset)
+        return(_stack[:, _rows, _cols])
+
+
+
 class transform:
     '''
     transformation helper functions
@@ -172,13 +534,22 @@ class transform:
         '''
         initializing class object
         '''
+    _triu = dict()
+    def get_triu(_size, _offset = 0):
+        '''
+        return cached upper triangle indices for matrix size _size
+        '''
+        import numpy
+        if (_size, _offset) not in transform._triu:
+            transform._triu[(_size, _offset)] = numpy.triu_indices(_size, _offset)
+        return(transform._triu[(_size, _offset)])
     def vectorize(_array):
         '''
         given a symmetric matrix , return entries of upper triangle
         matrix as flattened vector
         '''
         import numpy
-        vec = _array[numpy.triu_indices(_array.shape[0])]
+        vec = _array[transform.get_triu(_array.shape[0])]
         return(numpy.asarray(vec))
     def binarize(_array):
         '''
@@ -192,4 +563,171 @@ class transform:
         '''
         _binarray = _array.copy()
         _binarray[_binarray != 0] = 1
-        return(_binarray)
\ No newline at end of file
+        return(_binarray)
+
+
+#############################################
+#                                           #
+#          PARALLEL EXECUTION               #
+#                                           #
+#############################################
+
+_worker_state = dict()
+
+class checkpoint:
+    '''
+    per job result checkpoints written atomically to a run directory
+    with a manifest of completed jobs, used to resume interrupted runs
+
+    ---
+    input:
+        _directory of run checkpoints
+        [optional] _signature of run configuration, checkpoints of runs
+                   with a different signature are discarded
+    '''
+    def __init__(self, _directory, _signature = None):
+        '''
+        initialize checkpoint directory and load manifest
+        '''
+        import os, json
+        self.dir = _directory
+        self.signature = str(_signature)
+        os.makedirs(self.dir, exist_ok = True)
+        self.manifest = {'signature': self.signature, 'completed': dict()}
+        if os.path.isfile(os.path.join(self.dir, 'manifest.json')):
+            with open(os.path.join(self.dir, 'manifest.json')) as f:
+                _manifest = json.load(f)
+            if _manifest.get('signature') == self.signature:
+                self.manifest = _manifest
+            else:
+                helper.log_msg("UPDATE:    run configuration changed, discarding checkpoints in "+str(self.dir))
+    def get(_directory, _signature = None, _mode = 'use'):
+        '''
+        return checkpoint of run directory according to checkpoint mode
+
+        ---
+        input:
+            _directory of run checkpoints
+            [optional] _signature of run configuration
+            [optional] _mode <use> existing checkpoints, <restart> discarding
+                       existing checkpoints or <off>
+        output:
+            checkpoint object or None if _mode is <off>
+        '''
+        import os
+        if _mode == 'off':
+            return(None)
+        if _mode == 'restart' and os.path.isfile(os.path.join(_directory, 'manifest.json')):
+            os.remove(os.path.join(_directory, 'manifest.json'))
+        return(checkpoint(_directory, _signature))
+    def get_file(self, _key):
+        '''
+        return checkpoint filename of job key
+        '''
+        import os, hashlib
+        return(os.path.join(self.dir, hashlib.sha1(str(_key).encode()).hexdigest()[:16] + '.pkl'))
+    def done(self, _key):
+        '''
+        check whether job key is completed
+        '''
+        import os
+        return(str(_key) in self.manifest['completed'] and os.path.isfile(self.get_file(_key)))
+    def load(self, _key):
+        '''
+        load result of completed job key
+        '''
+        import pickle
+        with open(self.get_file(_key), 'rb') as f:
+            return(pickle.load(f))
+    def save(self, _key, _result):
+        '''
+        atomically write result of job key and update manifest
+        '''
+        import os, json, pickle, tempfile
+        _handle, _temp = tempfile.mkstemp(dir = self.dir, suffix = '.tmp')
+        with os.fdopen(_handle, 'wb') as f:
+            pickle.dump(_result, f, protocol = pickle.HIGHEST_PROTOCOL)
+        os.replace(_temp, self.get_file(_key))
+        self.manifest['completed'][str(_key)] = os.path.basename(self.get_file(_key))
+        _handle, _temp = tempfile.mkstemp(dir = self.dir, suffix = '.tmp')
+        with os.fdopen(_handle, 'w') as f:
+            json.dump(self.manifest, f, indent = 1)
+        os.replace(_temp, os.path.join(self.dir, 'manifest.json'))
+
+
+class scheduler:
+    '''
+    subject level parallel execution helper distributing
+    independent jobs across a process pool
+    '''
+    def __init__(self):
+        '''
+        initializing class object
+        '''
+    def get_workers(_workers = None):
+        '''
+        return number of worker processes to use
+        default: all cpu cores available to this process
+        '''
+        import multiprocessing, os
+        if not _workers:
+            if hasattr(os, 'sched_getaffinity'):
+                return(len(os.sched_getaffinity(0)))
+            return(multiprocessing.cpu_count())
+        return(max(1, int(_workers)))
+    def init_worker(_function, _shared):
+        '''
+        store function and shared arguments once per worker process
+        '''
+        _worker_state['function'] = _function
+        _worker_state['shared'] = _shared
+    def run_job(_job):
+        '''
+        run single job inside worker process and return result with job index
+        '''
+        _index, _args = _job
+        return(_index, _worker_state['function'](*_worker_state['shared'], *_args))
+    def run(_function, _jobs, _workers = None, _shared = (), _checkpoint = None, _keys = None):
+        '''
+        run _function for each argument tuple in _jobs using asynchronous
+        unordered submission to a process pool
+
+        ---
+        input:
+            _function to apply, called as _function(*_shared, *job)
+            _jobs list of argument tuples, e.g. per subject file paths
+            [optional] _workers number of processes, default = cpu count
+            [optional] _shared arguments transferred once per worker process
+            [optional] _checkpoint object, results are saved as jobs finish
+                       and completed jobs are skipped
+            [optional] _keys checkpoint key per job, e.g. subject ids,
+                       default = job arguments
+        output:
+            list of results in order of _jobs
+        '''
+        import multiprocessing
+        _jobs = list(_jobs)
+        _results = [None] * len(_jobs)
+        _keys = [ str(args) for args in _jobs ] if _keys is None else list(_keys)
+        _pending = list(range(len(_jobs)))
+        if _checkpoint is not None:
+            _pending = [ i for i in _pending if not _checkpoint.done(_keys[i]) ]
+            for i in set(range(len(_jobs))) - set(_pending):
+                _results[i] = _checkpoint.load(_keys[i])
+            if len(_pending) < len(_jobs):
+                helper.log_msg("UPDATE:    resuming from checkpoints, "+str(len(_jobs) - len(_pending))+" of "+str(len(_jobs))+" jobs completed")
+        _workers = min(scheduler.get_workers(_workers), max(1, len(_pending)))
+        if multiprocessing.current_process().daemon:
+            _workers = 1
+        if _workers == 1:
+            for i in _pending:
+                _results[i] = _function(*_shared, *_jobs[i])
+                if _checkpoint is not None:
+                    _checkpoint.save(_keys[i], _results[i])
+            return(_results)
+        with multiprocessing.Pool(_workers, initializer = scheduler.init_worker, initargs = (_function, _shared)) as pool:
+            for i, _result in pool.imap_unordered(scheduler.run_job, [ (i, _jobs[i]) for i in _pending ]):
+                _results[i] = _result
+                if _checkpoint is not None:
+                    _checkpoint.save(_keys[i], _result)
+        return(_results)